@@ -1,6 +1,8 @@
 # app/celery_app.py
 import os
 from celery import Celery
+import logging
+from celery.signals import worker_init, worker_process_init, task_postrun
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,4 +26,20 @@ celery_app.conf.update(
     task_time_limit=900,               # kill tasks >15 min
     task_soft_time_limit=840,
     task_track_started=True,
-)
\ No newline at end of file
+)
+
+
+@worker_init.connect
+@worker_process_init.connect
+def preload_worker_fonts(**kwargs):
+    # Parse the font presets once per worker process instead of once per text box; worker_init covers
+    # the threads pool, where tasks run in the main process and worker_process_init is never sent
+    from utils.font_registry import preload_fonts
+    preload_fonts()
+
+
+@task_postrun.connect
+def log_cache_stats(task=None, **kwargs):
+    # Per-process cache counters (hits, misses, latency, circuit breaker state) after every task
+    from utils.redis_cache import get_cache_stats
+    logging.getLogger(__name__).info(f"{task.name} cache stats: {get_cache_stats()}")
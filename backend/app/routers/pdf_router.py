@@ -1,16 +1,23 @@
 # app/routers/pdf_router.py
-import io
-import base64
+import uuid
+from celery import states
 from fastapi import APIRouter, UploadFile, File, Form
-from fastapi.responses import StreamingResponse, JSONResponse
-from services.pdf_service import process_pdf_bytes
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
+from services.pdf_service import process_pdf_bytes, PIPELINE_VERSION
 from configs.font_config import FONT_PRESETS
 from configs.language_config import NAME_TO_CODE
 from tasks.pdf_task import translate_pdf_task
+from utils.blob_store import blob_store, BlobWriter, delete_blobs, BLOB_CHUNK_SIZE
+from utils.redis_cache import get_cache_stats
+from utils.progress import PROGRESS_STATE
+from utils.result_cache import result_cache_key, lookup_result, claim_pending_task, replace_pending_task
 
 
 router = APIRouter()
 
+RESULT_FILENAME = "translated-document.pdf"
+
 @router.post("/translate")
 async def translate_pdf(
     file: UploadFile = File(...),
@@ -36,13 +43,43 @@ async def translate_pdf(
     if not font_metadata:
         return {"error": f"Font not found: {font_style}"}
 
-    # Read pdf bytes
-    pdf_bytes = await file.read()
-    pdf_b64 = base64.b64encode(pdf_bytes).decode()
+    # Spools the upload to the blob store chunk by chunk while hashing it; the task only carries the key.
+    # Each request gets its own upload blob, deleted by the task when it ends
+    writer = BlobWriter(f"uploads/{uuid.uuid4()}")
+    try:
+        while chunk := await file.read(BLOB_CHUNK_SIZE):
+            await run_in_threadpool(writer.write, chunk)
+        pdf_key = await run_in_threadpool(writer.commit)
+    finally:
+        writer.close()
+
+    # The digest computed while spooling is the document id reused by every cache layer
+    doc_id = writer.digest
+    cache_key = result_cache_key(doc_id, source_code, target_code, font_metadata, PIPELINE_VERSION)
+
+    # Same PDF and settings as an earlier request: returns a task that is already completed
+    result_key = await run_in_threadpool(lookup_result, cache_key)
+    if result_key:
+        await run_in_threadpool(delete_blobs, [pdf_key])
+        task_id = str(uuid.uuid4())
+        await run_in_threadpool(translate_pdf_task.backend.store_result, task_id, result_key, states.SUCCESS)
+        return {"task_id": task_id, "status": "completed"}
+
+    # Identical submissions in flight attach to the task that is already running
+    task_id = str(uuid.uuid4())
+    owner_id = await run_in_threadpool(claim_pending_task, cache_key, task_id)
+    if owner_id != task_id:
+        # Reading the state is a blocking result backend round trip
+        owner_state = await run_in_threadpool(lambda: translate_pdf_task.AsyncResult(owner_id).state)
+        if owner_state not in states.PROPAGATE_STATES:
+            await run_in_threadpool(delete_blobs, [pdf_key])
+            return {"task_id": owner_id, "status": "queued"}
+        await run_in_threadpool(replace_pending_task, cache_key, task_id)
 
     # Create task
-    task = translate_pdf_task.delay(
-        pdf_b64, font_metadata, source_code, target_code
+    task = translate_pdf_task.apply_async(
+        args=(pdf_key, font_metadata, source_code, target_code, doc_id),
+        task_id=task_id
     )
     return {"task_id": task.id, "status": "queued"}
 
@@ -69,13 +106,29 @@ async def get_task_status(task_id: str):
                 "info": str(task_result.info)
             }
         )
+    elif task_result.state == PROGRESS_STATE:
+        # Stage, pages and batches done and ETA reported by the pipeline
+        return JSONResponse(
+            content={
+                "task_id": task_id,
+                "status": "progress",
+                "progress": task_result.info
+            }
+        )
     elif task_result.state == "SUCCESS":
-        b64_result = task_result.result
-        pdf_bytes = base64.b64decode(b64_result)
+        result_key = task_result.result
+
+        # Local blobs are served as files (with Range support), remote blobs are streamed in chunks
+        result_path = blob_store.local_path(result_key)
+        if result_path is not None:
+            return FileResponse(result_path, media_type="application/pdf", filename=RESULT_FILENAME)
         return StreamingResponse(
-            io.BytesIO(pdf_bytes),
+            blob_store.iter_chunks(result_key),
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=translated-document.pdf"}
+            headers={
+                "Content-Disposition": f"attachment; filename={RESULT_FILENAME}",
+                "Content-Length": str(blob_store.size(result_key))
+            }
         )
     else:  # FAILED, RETRY, REVOKED
         response = JSONResponse(
@@ -86,4 +139,12 @@ async def get_task_status(task_id: str):
                 "error": str(task_result.info)
             }
         )
-    return response
\ No newline at end of file
+    return response
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Cache hit, miss, error and latency counters of the API process, plus the circuit breaker state.
+    """
+    return get_cache_stats()
@@ -1,18 +1,26 @@
 # app/services/pdf_service.py
 import io
-import re
+import os
 import json
-import time
-from PIL import Image
+import copy
 from collections import Counter
-import unicodedata
 import hashlib
 import logging
+import multiprocessing
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 import pymupdf
 import pymupdf.layout
 import pymupdf4llm
-from utils.translator import batch_translate, BATCH_SIZE, SLEEP_BETWEEN_REQUESTS
-from utils.redis_cache import cache_by_checksum
+from utils.translator import translate_texts, GROQ_MODEL, PROMPT_VERSION
+from utils.redis_cache import cache_by_checksum, cache_get_many, cache_set_many, binary_redis_client
+from utils.translation_memory import lookup_translations, store_translations
+from utils.font_registry import get_font, insert_document_font
+from utils.text_fit import fit_fontsizes
+from utils.text_sanitizer import sanitize_spans
+from utils.layout_codec import encode_layout, decode_layout, prune_layout, copy_layout, layout_size
+from utils.page_fingerprint import PageFingerprinter
+from utils.content_hash import content_digest
 
 
 logging.basicConfig(
@@ -21,6 +29,115 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Pages processed together: bounds intermediate memory while keeping translation batches full
+PIPELINE_WINDOW_PAGES = int(os.getenv("PIPELINE_WINDOW_PAGES", 8))
+# "single" draws figures and text into one document, "two_pass" keeps the figure-only PDF round trip
+RENDER_MODE = os.getenv("RENDER_MODE", "single")
+# "vector" copies figure regions from the source page, "raster" crops them from a rendered page
+FIGURE_MODE = os.getenv("FIGURE_MODE", "vector")
+# Resolution of rasterized figure boxes (144 dpi matches the former 2x page zoom)
+FIGURE_DPI = int(os.getenv("FIGURE_DPI", 144))
+# Codec of rasterized pictures: "jpeg" (embedded as DCT) or "flate" (lossless)
+FIGURE_PICTURE_CODEC = os.getenv("FIGURE_PICTURE_CODEC", "jpeg")
+FIGURE_JPEG_QUALITY = int(os.getenv("FIGURE_JPEG_QUALITY", 85))
+LAYOUT_CACHE_TTL = 60 * 60 * 2
+# Layouts are also cached per page under a content fingerprint, so revised documents only re-analyse changed pages
+PAGE_LAYOUT_NAMESPACE = "pdf_layout_page"
+# In-process (L1) layout cache in front of Redis, per worker process
+LAYOUT_LOCAL_CACHE_BYTES = int(os.getenv("LAYOUT_LOCAL_CACHE_BYTES", 64 * 1024 * 1024))
+# Identifies the rendered output for the result cache; bump the leading number when rendering changes
+PIPELINE_VERSION = f"1:{GROQ_MODEL}:{PROMPT_VERSION}:{FIGURE_MODE}:{FIGURE_DPI}:{FIGURE_PICTURE_CODEC}:{FIGURE_JPEG_QUALITY}"
+# Processes used for layout and rendering of one document (1 = in-process, 0 = one per CPU core)
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", 1))
+# "forkserver" children fork from a clean, pre-imported server instead of the (threaded) worker
+PIPELINE_START_METHOD = os.getenv("PIPELINE_START_METHOD", "forkserver")
+
+def redacted_page_copy(orig_page, keep_rects: list):
+    """
+    Copy orig_page into a scratch document and redact the text and the line art outside keep_rects.
+    A page shown with a clip rect is still embedded whole, so without this the original text of the
+    page would be extractable from the output and every figure would carry the page's content.
+    """
+    scratch_doc = pymupdf.open()
+    scratch_doc.insert_pdf(orig_page.parent, from_page=orig_page.number, to_page=orig_page.number)
+    page = scratch_doc[0]
+    keep_rects = [rect & page.rect for rect in keep_rects]
+
+    # Splits the page along the edges of the kept rects and redacts each row run of cells outside them
+    xs = sorted({page.rect.x0, page.rect.x1, *(x for rect in keep_rects for x in (rect.x0, rect.x1))})
+    ys = sorted({page.rect.y0, page.rect.y1, *(y for rect in keep_rects for y in (rect.y0, rect.y1))})
+    for y0, y1 in zip(ys, ys[1:]):
+        run_x0 = None
+        for x0, x1 in zip(xs, xs[1:]):
+            center = pymupdf.Point((x0 + x1) / 2, (y0 + y1) / 2)
+            if any(center in rect for rect in keep_rects):
+                if run_x0 is not None:
+                    page.add_redact_annot(pymupdf.Rect(run_x0, y0, x0, y1), fill=False, cross_out=False)
+                    run_x0 = None
+            elif run_x0 is None:
+                run_x0 = x0
+        if run_x0 is not None:
+            page.add_redact_annot(pymupdf.Rect(run_x0, y0, xs[-1], y1), fill=False, cross_out=False)
+
+    # Images may straddle a figure edge, so they are kept; hidden behind the clip rect they cost no text
+    page.apply_redactions(
+        images=pymupdf.PDF_REDACT_IMAGE_NONE,
+        graphics=pymupdf.PDF_REDACT_LINE_ART_REMOVE_IF_COVERED,
+        text=pymupdf.PDF_REDACT_TEXT_REMOVE
+    )
+    return scratch_doc
+
+
+def draw_figures(orig_page, page_data, new_page, figure_mode: str = FIGURE_MODE):
+    """
+    Copy figure-like boxes (images, formulas, tables) of an original page onto new_page.
+
+    - "vector": each box is shown with a clip rect from a copy of the source page whose text and
+      line art outside the boxes are redacted, keeping vectors, fonts and embedded images as they are.
+      Boxes that cannot be copied are rasterized.
+    - "raster": each box is rendered on its own at FIGURE_DPI using a clip rect.
+    """
+    figure_boxes = [box for box in page_data["boxes"] if box["boxclass"] in ["picture", "formula", "table"]]
+    if not figure_boxes:
+        return
+
+    if figure_mode == "vector":
+        figure_rects = [pymupdf.Rect(box["x0"], box["y0"], box["x1"], box["y1"]) for box in figure_boxes]
+        try:
+            source_doc = redacted_page_copy(orig_page, figure_rects)
+        except Exception as e:
+            logger.warning(f".:Cannot redact page {orig_page.number + 1} for vector figures, rasterizing: {e}")
+            source_doc = None
+
+        if source_doc is not None:
+            raster_boxes = []
+            for box, rect_pdf in zip(figure_boxes, figure_rects):
+                try:
+                    new_page.show_pdf_page(rect_pdf, source_doc, 0, clip=rect_pdf)
+                except Exception as e:
+                    logger.warning(f".:Cannot copy figure on page {orig_page.number + 1} as vector, rasterizing: {e}")
+                    raster_boxes.append(box)
+            source_doc.close()
+            if not raster_boxes:
+                return
+            figure_boxes = raster_boxes
+
+    # Renders only the figure rects; text-only pages never reach this point
+    for box in figure_boxes:
+        rect_pdf = pymupdf.Rect(box["x0"], box["y0"], box["x1"], box["y1"]) & orig_page.rect
+        if rect_pdf.is_empty:
+            continue
+
+        pix = orig_page.get_pixmap(dpi=FIGURE_DPI, clip=rect_pdf)
+
+        # Pictures may be stored lossy; formulas and tables are always lossless to keep glyph edges sharp
+        if box["boxclass"] == "picture" and FIGURE_PICTURE_CODEC == "jpeg":
+            new_page.insert_image(rect_pdf, stream=pix.tobytes("jpeg", jpg_quality=FIGURE_JPEG_QUALITY))
+        else:
+            # The pixmap samples are Flate-compressed directly, without a PNG encode/decode
+            new_page.insert_image(rect_pdf, pixmap=pix)
+
+
 def insert_figure(orig_doc, data, output_pdf_buffer):
     """
     Create a new PDF that contains only figure-like boxes (images, formulas, tables)
@@ -32,34 +149,8 @@ def insert_figure(orig_doc, data, output_pdf_buffer):
         pdf_width, pdf_height = page_data["width"], page_data["height"]
         new_page = new_doc.new_page(width=pdf_width, height=pdf_height)
 
-        orig_page = orig_doc[page_ix]
-        
-        zoom = 2.0
-        mat = pymupdf.Matrix(zoom, zoom)
-        pix_full = orig_page.get_pixmap(matrix=mat)
-
-        img = Image.open(io.BytesIO(pix_full.tobytes("png")))
-        image_width, image_height = img.size
-
-        for box in page_data["boxes"]:
-            boxclass = box["boxclass"]
-            if boxclass not in ["picture", "formula", "table"]:
-                continue
-
-            pdf_x0, pdf_y0, pdf_x1, pdf_y1 = box["x0"], box["y0"], box["x1"], box["y1"]
-
-            img_x0 = int(image_width  * (pdf_x0 / pdf_width))
-            img_y0 = int(image_height * (pdf_y0 / pdf_height))
-            img_x1 = int(image_width  * (pdf_x1 / pdf_width))
-            img_y1 = int(image_height * (pdf_y1 / pdf_height))
-
-            cropped_img = img.crop((img_x0, img_y0, img_x1, img_y1))
-
-            img_byte_arr = io.BytesIO()
-            cropped_img.save(img_byte_arr, format="PNG")
-
-            rect_pdf = pymupdf.Rect(pdf_x0, pdf_y0, pdf_x1, pdf_y1)
-            new_page.insert_image(rect_pdf, stream=img_byte_arr.getvalue())
+        orig_page = orig_doc[page_data["page_number"] - 1]
+        draw_figures(orig_page=orig_page, page_data=page_data, new_page=new_page)
 
     new_doc.save(output_pdf_buffer)
     new_doc.close()
@@ -86,51 +177,16 @@ def consolidate_box_text(box):
     """
     Clean and merge text spans and lines found inside a layout box.
     """
-    consolidated_lines = []
     colors = []
+    span_texts = []
 
     for text_line in box.get("textlines", []):
-        line_text_parts = []
-        
         for span in text_line.get("spans", []):
-            raw_text = span.get("text", "")
-            color = span.get("color", 0)
-            colors.append(color)
-
-            # Removes control/non-printable characters (except whitespace, tab, newline),
-            text = ''.join(ch for ch in raw_text if unicodedata.category(ch)[0] != 'C' or ch in ' \t\n\r')
-
-            # Removes stray combining diacritics that often appear due to font issues
-            text = text.replace('\u02C6', '')   # ^
-            text = text.replace('\u005E', '')   # ^ (ASCII)
-            text = text.replace('\u0302', '')   # combining circumflex
-            text = text.replace('\u0309', '')   # combining hook above
-            text = text.replace('\u0306', '')   # combining breve
-            text = text.replace('\u0301', '')   # acute
-            text = text.replace('\u0300', '')   # grave
-            text = text.replace('\u0303', '')   # tilde
-            text = text.replace('\u0309', '')   # hook above
-            text = text.replace('\u0323', '')   # dot below
-            
-            # Collapses multiple consecutive spaces
-            text = re.sub(r'\s{2,}', ' ', text)
-
-            # Normalizes Unicode (NFC)
-            text = unicodedata.normalize('NFC', text)
-
-            # Removes repeated meaningless symbols
-            text = re.sub(r'([^a-zA-Z0-9\u00C0-\u1FFF\u2000-\u206F])\1{3,}', '', text)
+            span_texts.append(span.get("text", ""))
+            colors.append(span.get("color", 0))
 
-            # Joins cleaned spans into a single string
-            cleaned = text.strip()
-            if cleaned:
-                line_text_parts.append(cleaned)
-
-        if line_text_parts:
-            consolidated_lines.append(" ".join(line_text_parts))
-
-    # Joins cleaned lines into a single string
-    consolidated_box_text = " ".join(consolidated_lines).strip()
+    # Cleans every span and joins the non-empty ones (and lines) with single spaces
+    consolidated_box_text = sanitize_spans(span_texts)
 
     # Get most common color
     color = Counter(colors).most_common(1)[0][0] if colors else 0
@@ -183,82 +239,34 @@ def simulate_text_height(text, rect, font, fontsize):
     return total_height
 
 
-def estimate_fontsize_for_box_text(text, rect, font_name, font_file_path, boxclass,
-                                  min_fontsize=4, max_fontsize=20, epochs=30,
-                                  tolerance=0.01):
+def estimate_fontsizes_for_box_texts(texts, rects, font_name, font_file_path, boxclasses,
+                                     min_fontsize=4, max_fontsize=20, tolerance=0.01) -> list[float]:
     """
-    Find a font size that best fits text inside rect using a binary search.
+    Find, for each box, the largest font size at which insert_textbox fits its text inside its rect.
+    The boxes share one font and are fitted together.
     """
-    if not text or not text.strip():
-        return min_fontsize
-
-    font = pymupdf.Font(fontname=font_name, fontfile=font_file_path)
-    x0, y0, x1, y1 = rect
-    rect_width = abs(x1 - x0)
-    rect_height = abs(y1 - y0) * 1.05
-
-    if rect_width <= 0 or rect_height <= 0:
-        return min_fontsize
-
-    low = min_fontsize
-    high = max_fontsize
-    fit_fontsize = min_fontsize
+    font = get_font(font_name, font_file_path)
 
     # Adjust max_fontsize based on boxclass for better initial range
-    if boxclass in ["title", "section-header"]:
-        high = max_fontsize * 1.2
-    elif boxclass in ["text", "list-item"]:
-        high = max_fontsize * 0.8
-
-    for _ in range(epochs):
-        mid = (low + high) / 2
-        estimated_height = simulate_text_height(text, rect, font, mid)
-
-        if estimated_height <= rect_height:
-            fit_fontsize = mid
-            low = mid + tolerance
-        else:
-            high = mid - tolerance
+    highs = [max_fontsize * 0.8 if boxclass in ["text", "list-item"] else max_fontsize for boxclass in boxclasses]
 
-        if abs(high - low) < tolerance:
-            break
-    
-    fit_fontsize = max(min_fontsize, min(max_fontsize, fit_fontsize))
-    return fit_fontsize
+    fit = fit_fontsizes(texts, rects, font, min_fontsize=min_fontsize, max_fontsizes=highs, tolerance=tolerance)
+    return [max(min_fontsize, min(max_fontsize, fontsize)) for fontsize in fit]
 
-def insert_text(
-    data,
-    input_pdf_bytes,
-    output_pdf_buffer,
-    font_metadata,
-    source_lang_code: str = "en",
-    target_lang_code: str = "vi"
-):
+def collect_text_boxes(data) -> list[dict]:
     """
-    Insert translated text into a figure-only PDF, producing a final translated PDF.
+    Pad and consolidate the text boxes of data. Each item refers to its page by page_ix,
+    the index of the page in data["pages"].
     """
     # Adjusts box paddings
     data = padding_box(data, padding_small=2.5, padding_large=3)
-    
-    # Opens the input PDF (bytes or file-like)
-    if isinstance(input_pdf_bytes, bytes):
-        doc = pymupdf.open(stream=input_pdf_bytes, filetype="pdf")
-    elif isinstance(input_pdf_bytes, io.BytesIO):
-        doc = pymupdf.open(stream=input_pdf_bytes.getvalue(), filetype="pdf")
-    else:
-        doc = pymupdf.open(input_pdf_bytes)
-
-    boxes_to_translate = []
 
+    text_boxes = []
     for page_ix, page_data in enumerate(data["pages"]):
-        page = doc[page_ix]
-        page.insert_font(fontname=font_metadata["regular_font_name"], fontfile=font_metadata["regular_font_file_path"])
-        page.insert_font(fontname=font_metadata["bold_font_name"], fontfile=font_metadata["bold_font_file_path"])
-
         for box in page_data["boxes"]:
             if box["boxclass"] in ["picture", "formula", "table"]:
                 continue
-            
+
             # Consolidates text for each text box
             box_info = consolidate_box_text(box)
             # Filters out non-text boxes
@@ -266,65 +274,98 @@ def insert_text(
             if not text:
                 continue
 
-            boxes_to_translate.append({
-                "page": page,
-                "rect": pymupdf.Rect(box_info["rect"]),
+            text_boxes.append({
+                "page_ix": page_ix,
+                "rect": box_info["rect"],
                 "text": text,
                 "color": box_info["color"],
                 "boxclass": box["boxclass"]
             })
+    return text_boxes
 
-    total_boxes = len(boxes_to_translate)
-    if total_boxes == 0:
-        doc.save(output_pdf_buffer)
-        doc.close()
-        return
-
-    logger.info(f".:Number of boxes in pdf: {total_boxes} box, {((total_boxes - 1) // BATCH_SIZE) + 1} batch")
-
-    all_translated = []
 
-    # Translates texts in batches using batch_translate
-    for i in range(0, total_boxes, BATCH_SIZE):
-        batch = boxes_to_translate[i:i + BATCH_SIZE]
-        batch_texts = [item["text"] for item in batch]
+def translate_box_texts(texts: list[str], source_lang_code: str = "en", target_lang_code: str = "vi",
+                        progress=None) -> list[str]:
+    """
+    Translate box texts through the translation memory; only unique misses are sent to the LLM.
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    remembered = lookup_translations(
+        unique_texts,
+        source_lang_code=source_lang_code,
+        target_lang_code=target_lang_code,
+        model=GROQ_MODEL,
+        prompt_version=PROMPT_VERSION
+    )
+    translated_by_text = {text: tr for text, tr in zip(unique_texts, remembered) if tr is not None}
+    pending_texts = [text for text in unique_texts if text not in translated_by_text]
 
-        logger.info(f"\t.:Translating batch {i // BATCH_SIZE + 1} ({len(batch)} box)...")
-        
-        batch_translated = batch_translate(
-            batch_texts,
-            source_lang_code=source_lang_code,
-            target_lang_code=target_lang_code
-        )
-        all_translated.extend(batch_translated)
+    logger.info(f".:Number of boxes in pdf: {len(texts)} box, {len(translated_by_text)} from translation memory")
 
-        if i + BATCH_SIZE < total_boxes:
-            logger.info(f"\t.:Sleep {SLEEP_BETWEEN_REQUESTS} seconds...")
-            time.sleep(SLEEP_BETWEEN_REQUESTS)
+    # Translates the misses in token-aware batches, concurrently and paced by the provider rate limit
+    pending_translated, from_llm = translate_texts(
+        pending_texts,
+        source_lang_code=source_lang_code,
+        target_lang_code=target_lang_code,
+        progress=progress
+    )
+    translated_by_text.update(zip(pending_texts, pending_translated))
+
+    # Only LLM output is remembered, including text the model kept as-is (names, URLs, numbers);
+    # Google fallbacks and untranslated source text report False and are retried next time
+    memorable = [
+        (text, translation) for text, translation, llm in zip(pending_texts, pending_translated, from_llm)
+        if llm
+    ]
+    store_translations(
+        [text for text, _ in memorable],
+        [translation for _, translation in memorable],
+        source_lang_code=source_lang_code,
+        target_lang_code=target_lang_code,
+        model=GROQ_MODEL,
+        prompt_version=PROMPT_VERSION
+    )
 
     logger.info(".:Successfully translate all batch text!")
+    return [translated_by_text[text] for text in texts]
 
-    # Insert translated text
-    for item, translated_text in zip(boxes_to_translate, all_translated):
-        page = item["page"]
-        rect = item["rect"]
-        color = item["color"]
-        boxclass = item["boxclass"]
-
-        fontname = font_metadata["bold_font_name"] if boxclass in ["title", "section-header"] else font_metadata["regular_font_name"]
 
-        # Estimates appropriate font sizes
-        fontsize = estimate_fontsize_for_box_text(
-            text=translated_text,
-            rect=rect,
-            font_name=font_metadata["regular_font_name"],
-            font_file_path=font_metadata["regular_font_file_path"],
-            boxclass=boxclass,
+def draw_text_boxes(doc, page_numbers, text_boxes: list[dict], translations: list[str], font_metadata):
+    """
+    Draw translated text boxes onto doc; page_numbers maps each box's page_ix to a page of doc.
+    """
+    for page_number in page_numbers:
+        page = doc[page_number]
+        insert_document_font(page, font_metadata["regular_font_name"], font_metadata["regular_font_file_path"])
+        insert_document_font(page, font_metadata["bold_font_name"], font_metadata["bold_font_file_path"])
+
+    font_styles = ["bold" if item["boxclass"] in ["title", "section-header"] else "regular" for item in text_boxes]
+
+    # Estimates appropriate font sizes with the font each box is rendered with, one batch per font
+    fontsizes = [None] * len(text_boxes)
+    for font_style in ("regular", "bold"):
+        box_ixs = [ix for ix, style in enumerate(font_styles) if style == font_style]
+        if not box_ixs:
+            continue
+        estimated = estimate_fontsizes_for_box_texts(
+            texts=[translations[ix] for ix in box_ixs],
+            rects=[pymupdf.Rect(text_boxes[ix]["rect"]) for ix in box_ixs],
+            font_name=font_metadata[f"{font_style}_font_name"],
+            font_file_path=font_metadata[f"{font_style}_font_file_path"],
+            boxclasses=[text_boxes[ix]["boxclass"] for ix in box_ixs],
             min_fontsize=4,
             max_fontsize=28,
-            epochs=30,
             tolerance=0.005
         )
+        for ix, fontsize in zip(box_ixs, estimated):
+            fontsizes[ix] = fontsize
+
+    # Insert translated text
+    for item, translated_text, font_style, fontsize in zip(text_boxes, translations, font_styles, fontsizes):
+        page = doc[page_numbers[item["page_ix"]]]
+        rect = pymupdf.Rect(item["rect"])
+        color = item["color"]
+        fontname = font_metadata[f"{font_style}_font_name"]
 
         max_attempts = 100
         attempt = 0
@@ -350,61 +391,429 @@ def insert_text(
                     attempt += 1
 
             except Exception as e:
-                logger.warning(f".:Error inserting textbox at page {page_ix+1}: {e}")
+                logger.warning(f".:Error inserting textbox at page {page.number + 1}: {e}")
                 fontsize *= 0.99
                 attempt += 1
 
+def draw_translated_text(
+    doc,
+    page_numbers,
+    data,
+    font_metadata,
+    source_lang_code: str = "en",
+    target_lang_code: str = "vi",
+    progress=None
+):
+    """
+    Translate the text boxes of data and draw them onto the pages of doc listed in page_numbers
+    (aligned with data["pages"]).
+    """
+    text_boxes = collect_text_boxes(data)
+    if not text_boxes:
+        return
+
+    if progress is not None:
+        progress.set_stage("translation")
+    translations = translate_box_texts(
+        [item["text"] for item in text_boxes],
+        source_lang_code=source_lang_code,
+        target_lang_code=target_lang_code,
+        progress=progress
+    )
+    if progress is not None:
+        progress.set_stage("render")
+    draw_text_boxes(doc, page_numbers, text_boxes, translations, font_metadata)
+
+def insert_text(
+    data,
+    input_pdf_bytes,
+    output_pdf_buffer,
+    font_metadata,
+    source_lang_code: str = "en",
+    target_lang_code: str = "vi",
+    progress=None
+):
+    """
+    Insert translated text into a figure-only PDF, producing a final translated PDF.
+    """
+    # Opens the input PDF (bytes or file-like)
+    if isinstance(input_pdf_bytes, bytes):
+        doc = pymupdf.open(stream=input_pdf_bytes, filetype="pdf")
+    elif isinstance(input_pdf_bytes, io.BytesIO):
+        doc = pymupdf.open(stream=input_pdf_bytes.getvalue(), filetype="pdf")
+    else:
+        doc = pymupdf.open(input_pdf_bytes)
+
+    draw_translated_text(
+        doc=doc,
+        page_numbers=list(range(len(data["pages"]))),
+        data=data,
+        font_metadata=font_metadata,
+        source_lang_code=source_lang_code,
+        target_lang_code=target_lang_code,
+        progress=progress
+    )
+
     # Saves the final PDF into output_pdf_buffer
     doc.save(output_pdf_buffer)
     doc.close()
     logger.info(f".:Successfully translating PDF file!")
 
-@cache_by_checksum(ttl=60 * 60 * 2, namespace="pdf_layout")
-def get_layout_data(pdf_bytes: bytes) -> dict:
+def _decode_window_layout(blob: bytes) -> dict:
+    # Decodes every page up front, so a corrupt entry is a cache miss instead of an error mid-pipeline
+    return {"pages": list(decode_layout(blob)["pages"])}
+
+@cache_by_checksum(ttl=LAYOUT_CACHE_TTL, namespace="pdf_layout", dumps=encode_layout, loads=_decode_window_layout,
+                   local_cache_bytes=LAYOUT_LOCAL_CACHE_BYTES, copy_value=copy_layout)
+def get_layout_data(pdf_bytes: bytes, first_page: int = 0, last_page: int = None, doc_id: str = None) -> dict:
+    # doc_id only names pdf_bytes in the cache key
     # Open the original PDF bytes
     orig_doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
 
-    # Runs layout detection to JSON
+    # Restricts layout detection to a page window when requested
+    if last_page is None:
+        last_page = orig_doc.page_count
+    page_numbers = list(range(first_page, last_page))
+
+    # Reuses the layout of every page whose content is unchanged since it was last analysed
+    page_keys = [f"{PAGE_LAYOUT_NAMESPACE}:{fingerprint}"
+                 for fingerprint in PageFingerprinter(orig_doc).fingerprints(page_numbers)]
+    pages = [_decode_page_layout(raw, page_number)
+             for raw, page_number in zip(cache_get_many(page_keys, client=binary_redis_client), page_numbers)]
+
+    # Identical pages within the window are analysed once
+    missing = {}
+    for page_number, page_key, page in zip(page_numbers, page_keys, pages):
+        if page is None:
+            missing.setdefault(page_key, page_number)
+
+    if missing:
+        detected = _detect_page_layouts(orig_doc, list(missing.values()))
+        # Pages left out of the result are retried on their own; nothing is cached for a page without a layout
+        for page_number in [page_number for page_number in missing.values() if page_number not in detected]:
+            detected.update(_detect_page_layouts(orig_doc, [page_number]))
+        undetected = [page_number + 1 for page_number in missing.values() if page_number not in detected]
+        if undetected:
+            orig_doc.close()
+            raise ValueError(f"Layout detection returned no result for pages {undetected}")
+
+        cache_set_many(
+            {page_key: encode_layout({"pages": [detected[page_number]]}) for page_key, page_number in missing.items()},
+            LAYOUT_CACHE_TTL,
+            client=binary_redis_client
+        )
+
+        for ix, (page_number, page_key) in enumerate(zip(page_numbers, page_keys)):
+            if pages[ix] is None:
+                page = detected[missing[page_key]]
+                # Pages are padded in place later, so duplicates get their own copy
+                pages[ix] = page if missing[page_key] == page_number else dict(copy.deepcopy(page), page_number=page_number + 1)
+
+    logger.info(f".:Layout of pages {first_page + 1}-{last_page}: {len(missing)} analysed, "
+                f"{len(page_numbers) - len(missing)} reused")
+    orig_doc.close()
+    return {"pages": pages}
+
+def _detect_page_layouts(orig_doc, page_numbers: list) -> dict:
+    """
+    Run layout detection on page_numbers and return their pruned layouts by page number.
+    """
     json_text = pymupdf4llm.to_json(
         orig_doc,
         image_dpi=300,
         image_format="png",
-        image_path=""
+        image_path="",
+        pages=page_numbers
     )
+    # Keeps only the fields the pipeline reads
+    return {page["page_number"] - 1: page for page in prune_layout(json.loads(json_text))["pages"]}
 
-    data = json.loads(json_text)
-
-    orig_doc.close()
-    return data
-
-def process_pdf_bytes(
-    pdf_bytes: bytes,
+def _decode_page_layout(raw: bytes, page_number: int):
+    """
+    Layout of one page from the per-page cache, renumbered to its position in this document.
+    """
+    if raw is None:
+        return None
+    try:
+        page = decode_layout(raw)["pages"][0]
+    except (ValueError, IndexError) as e:
+        logger.warning(f"Invalid cached page layout: {e}")
+        return None
+    page["page_number"] = page_number + 1
+    return page
+
+def iter_page_units(pdf_bytes: bytes, page_count: int, window_pages: int = PIPELINE_WINDOW_PAGES, doc_id: str = None,
+                    progress=None):
+    """
+    Yield one work unit per page. Layout is detected (and cached) one window of pages at a time.
+    """
+    for first_page in range(0, page_count, window_pages):
+        last_page = min(first_page + window_pages, page_count)
+        if progress is not None:
+            progress.set_stage("layout")
+        data = get_layout_data(pdf_bytes=pdf_bytes, first_page=first_page, last_page=last_page, doc_id=doc_id)
+
+        for page_data in data["pages"]:
+            yield {
+                "page_ix": page_data["page_number"] - 1,
+                "page_data": page_data
+            }
+
+def render_page_units(
+    orig_doc,
+    units: list,
+    out_doc,
     font_metadata: dict,
     source_lang_code: str = "en",
-    target_lang_code: str = "vi"
-) -> bytes:
+    target_lang_code: str = "vi",
+    render_mode: str = RENDER_MODE,
+    progress=None
+):
     """
-    Full pipeline entrypoint that converts an input PDF into a translated PDF (bytes).
+    Crop figures, translate and render text for a window of page units, appending the pages to out_doc.
+
+    - "single": figures and text are drawn straight into out_doc.
+    - "two_pass": figures go to a figure-only PDF that is serialized and re-parsed before drawing text.
     """
-    # Get layout data from Redis cache
-    data = get_layout_data(pdf_bytes=pdf_bytes)
+    data = {"pages": [unit["page_data"] for unit in units]}
+    if progress is not None:
+        progress.set_stage("figures")
+
+    if render_mode == "single":
+        first_page_number = out_doc.page_count
+        for page_data in data["pages"]:
+            new_page = out_doc.new_page(width=page_data["width"], height=page_data["height"])
+            orig_page = orig_doc[page_data["page_number"] - 1]
+            draw_figures(orig_page=orig_page, page_data=page_data, new_page=new_page)
+
+        draw_translated_text(
+            doc=out_doc,
+            page_numbers=list(range(first_page_number, out_doc.page_count)),
+            data=data,
+            font_metadata=font_metadata,
+            source_lang_code=source_lang_code,
+            target_lang_code=target_lang_code,
+            progress=progress
+        )
+        return
 
-    # Builds a figure-only PDF
-    orig_doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    # Builds a figure-only PDF for the window
     fig_output_buffer = io.BytesIO()
     insert_figure(orig_doc=orig_doc, data=data, output_pdf_buffer=fig_output_buffer)
-    fig_pdf_bytes = fig_output_buffer.getvalue()
-    orig_doc.close()
 
     # Inserts translated text into the figure PDF
-    final_output_buffer = io.BytesIO()
+    window_output_buffer = io.BytesIO()
     insert_text(
         data=data,
-        input_pdf_bytes=fig_pdf_bytes,
-        output_pdf_buffer=final_output_buffer,
+        input_pdf_bytes=fig_output_buffer.getvalue(),
+        output_pdf_buffer=window_output_buffer,
         font_metadata=font_metadata,
         source_lang_code=source_lang_code,
-        target_lang_code=target_lang_code
+        target_lang_code=target_lang_code,
+        progress=progress
     )
-    
-    return final_output_buffer.getvalue()
\ No newline at end of file
+
+    # Appends the rendered window to the output document
+    with pymupdf.open(stream=window_output_buffer.getvalue(), filetype="pdf") as window_doc:
+        out_doc.insert_pdf(window_doc)
+
+# Source document of the pool process, opened once by _init_shard_worker
+_shard_doc = None
+_shard_pdf_bytes = None
+_shard_doc_id = None
+
+def _init_shard_worker(pdf_bytes: bytes, doc_id: str):
+    global _shard_doc, _shard_pdf_bytes, _shard_doc_id
+    _shard_pdf_bytes = pdf_bytes
+    _shard_doc_id = doc_id
+    _shard_doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+
+def _extract_shard(first_page: int, last_page: int):
+    """
+    Pool job: layout (cached) and text boxes of one page range.
+    """
+    data = get_layout_data(pdf_bytes=_shard_pdf_bytes, first_page=first_page, last_page=last_page, doc_id=_shard_doc_id)
+    return data["pages"], collect_text_boxes(data)
+
+def _render_shard(pages: list, text_boxes: list, translations: list, font_metadata: dict) -> bytes:
+    """
+    Pool job: draw the figures and translated text of one page range into a standalone PDF.
+    """
+    shard_doc = pymupdf.open()
+    for page_data in pages:
+        new_page = shard_doc.new_page(width=page_data["width"], height=page_data["height"])
+        orig_page = _shard_doc[page_data["page_number"] - 1]
+        draw_figures(orig_page=orig_page, page_data=page_data, new_page=new_page)
+
+    draw_text_boxes(shard_doc, list(range(shard_doc.page_count)), text_boxes, translations, font_metadata)
+
+    result = shard_doc.tobytes()
+    shard_doc.close()
+    return result
+
+def pipeline_workers(workers: int = PIPELINE_WORKERS) -> int:
+    """
+    Number of pool processes to use, 1 when this process is not allowed to have children.
+    """
+    workers = workers if workers > 0 else os.cpu_count() or 1
+    if workers > 1 and multiprocessing.current_process().daemon:
+        # Celery prefork children are daemonic; the worker has to run with --pool threads for this
+        logger.warning(".:Daemonic process (Celery prefork pool) cannot start a process pool, rendering in-process")
+        return 1
+    return workers
+
+def process_pdf_bytes_parallel(
+    pdf_bytes: bytes,
+    font_metadata: dict,
+    source_lang_code: str = "en",
+    target_lang_code: str = "vi",
+    workers: int = PIPELINE_WORKERS,
+    shard_pages: int = PIPELINE_WINDOW_PAGES,
+    doc_id: str = None,
+    progress=None
+) -> bytes:
+    """
+    Parallel variant of process_pdf_bytes: page ranges are sharded across a process pool for layout
+    extraction and rendering, while translation stays in this process so that the translation memory,
+    batching and provider rate limit are shared. Shard PDFs are merged in page order with insert_pdf.
+    """
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as orig_doc:
+        page_count = orig_doc.page_count
+    if progress is not None:
+        progress.set_pages_total(page_count)
+
+    # Shards match the windows of the serial pipeline, so both modes share the layout cache
+    shards = [(first_page, min(first_page + shard_pages, page_count)) for first_page in range(0, page_count, shard_pages)]
+
+    out_doc = pymupdf.open()
+    context = multiprocessing.get_context(PIPELINE_START_METHOD)
+    if PIPELINE_START_METHOD == "forkserver":
+        context.set_forkserver_preload([__name__])
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards)) or 1, mp_context=context,
+                             initializer=_init_shard_worker, initargs=(pdf_bytes, doc_id or content_digest(pdf_bytes))) as pool:
+        layout_futures = [pool.submit(_extract_shard, first_page, last_page) for first_page, last_page in shards]
+
+        # Translates each shard as soon as its layout is ready; rendering overlaps with later shards
+        render_futures = []
+        for layout_future in layout_futures:
+            if progress is not None:
+                progress.set_stage("layout")
+            pages, text_boxes = layout_future.result()
+            if progress is not None:
+                progress.set_stage("translation")
+            translations = translate_box_texts(
+                [item["text"] for item in text_boxes],
+                source_lang_code=source_lang_code,
+                target_lang_code=target_lang_code,
+                progress=progress
+            ) if text_boxes else []
+            render_futures.append(pool.submit(_render_shard, pages, text_boxes, translations, font_metadata))
+
+        # Figures and text of the remaining shards are drawn by the pool
+        if progress is not None:
+            progress.set_stage("render")
+        for (first_page, last_page), render_future in zip(shards, render_futures):
+            with pymupdf.open(stream=render_future.result(), filetype="pdf") as shard_doc:
+                out_doc.insert_pdf(shard_doc)
+            logger.info(f".:Rendered pages {first_page + 1}-{last_page}/{page_count}")
+            if progress is not None:
+                progress.pages_completed(last_page - first_page)
+
+    # Every shard embeds its own copy of the fonts; garbage=4 also merges identical streams
+    result = out_doc.tobytes(garbage=4, deflate=True)
+    out_doc.close()
+    return result
+
+def pdf_page_count(pdf_bytes: bytes) -> int:
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.page_count
+
+def split_pdf_pages(pdf_bytes: bytes, chunk_pages: int) -> list[bytes]:
+    """
+    Split a PDF into standalone documents of at most chunk_pages pages each, in page order.
+    """
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+        if doc.page_count <= chunk_pages:
+            return [pdf_bytes]
+
+        chunks = []
+        for first_page in range(0, doc.page_count, chunk_pages):
+            with pymupdf.open() as chunk_doc:
+                chunk_doc.insert_pdf(doc, from_page=first_page, to_page=min(first_page + chunk_pages, doc.page_count) - 1)
+                chunks.append(chunk_doc.tobytes(garbage=1))
+        return chunks
+
+def merge_pdfs(pdf_chunks: list[bytes]) -> bytes:
+    """
+    Concatenate translated PDF chunks in order into one document.
+    """
+    with pymupdf.open() as out_doc:
+        for chunk_bytes in pdf_chunks:
+            with pymupdf.open(stream=chunk_bytes, filetype="pdf") as chunk_doc:
+                out_doc.insert_pdf(chunk_doc)
+
+        # Every chunk embeds its own copy of the fonts; garbage=4 also merges identical streams
+        return out_doc.tobytes(garbage=4, deflate=True)
+
+def process_pdf_bytes(
+    pdf_bytes: bytes,
+    font_metadata: dict,
+    source_lang_code: str = "en",
+    target_lang_code: str = "vi",
+    render_mode: str = RENDER_MODE,
+    doc_id: str = None,
+    progress=None
+) -> bytes:
+    """
+    Full pipeline entrypoint that converts an input PDF into a translated PDF (bytes).
+    Pages stream through layout, figure crop, translation and rendering one window at a time,
+    and each rendered window is appended to the output so intermediates stay bounded.
+    With more than one pipeline worker, "single" rendering runs sharded across a process pool.
+    doc_id is the content digest of pdf_bytes when the caller already has it; it is computed once otherwise.
+    progress (a ProgressReporter) receives the stage, page and translation batch events.
+    """
+    doc_id = doc_id or content_digest(pdf_bytes)
+    workers = pipeline_workers()
+    if workers > 1 and render_mode == "single":
+        return process_pdf_bytes_parallel(
+            pdf_bytes=pdf_bytes,
+            font_metadata=font_metadata,
+            source_lang_code=source_lang_code,
+            target_lang_code=target_lang_code,
+            workers=workers,
+            doc_id=doc_id,
+            progress=progress
+        )
+
+    orig_doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    out_doc = pymupdf.open()
+
+    if progress is not None:
+        progress.set_pages_total(orig_doc.page_count)
+    units = iter_page_units(pdf_bytes=pdf_bytes, page_count=orig_doc.page_count, doc_id=doc_id, progress=progress)
+    while True:
+        window = list(islice(units, PIPELINE_WINDOW_PAGES))
+        if not window:
+            break
+
+        render_page_units(
+            orig_doc=orig_doc,
+            units=window,
+            out_doc=out_doc,
+            font_metadata=font_metadata,
+            source_lang_code=source_lang_code,
+            target_lang_code=target_lang_code,
+            render_mode=render_mode,
+            progress=progress
+        )
+        logger.info(f".:Rendered pages {window[0]['page_ix'] + 1}-{window[-1]['page_ix'] + 1}/{orig_doc.page_count}")
+        if progress is not None:
+            progress.pages_completed(len(window))
+
+    orig_doc.close()
+
+    # Merges the font and image objects repeated across pages and windows
+    result = out_doc.tobytes(garbage=3, deflate=True)
+    out_doc.close()
+    return result
@@ -1,23 +1,141 @@
 # app/tasks/pdf_task.py
-import base64
+import os
+import logging
+from celery import chord
+from celery.exceptions import Ignore
+from dotenv import load_dotenv
 from celery_app import celery_app
-from services.pdf_service import process_pdf_bytes
+from services.pdf_service import process_pdf_bytes, split_pdf_pages, merge_pdfs, pdf_page_count, PIPELINE_VERSION
+from utils.blob_store import put_blob, get_blob, blob_digest, delete_blobs
+from utils.result_cache import result_cache_key, store_result, release_pending_task
+from utils.progress import ProgressReporter, start_parts
+
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Documents above this many pages are split into chunks translated by separate tasks
+CHUNK_PAGES = int(os.getenv("CHUNK_PAGES", 40))
+CHUNK_MAX_RETRIES = int(os.getenv("CHUNK_MAX_RETRIES", 3))
 
 
 @celery_app.task(bind=True, name="pdf.translate")
 def translate_pdf_task(
     self,
-    pdf_bytes_base64: str,
+    pdf_key: str,
     font_metadata: dict,
     source_code: str,
     target_code: str,
+    doc_id: str = None,
 ):
-    pdf_bytes = base64.b64decode(pdf_bytes_base64)
+    """
+    Translate the uploaded PDF stored under pdf_key and return the blob key of the result.
+    doc_id is the content digest of the upload; it is taken from pdf_key when not given.
+    Progress is reported as PROGRESS task meta and on the progress:<task_id> Redis channel.
+    The upload blob is deleted when the task ends, and a failure releases the pending entry.
+    """
+    doc_id = doc_id or blob_digest(pdf_key)
+    cache_key = result_cache_key(doc_id, source_code, target_code, font_metadata, PIPELINE_VERSION)
+    try:
+        pdf_bytes = get_blob(pdf_key)
 
+        chunks = split_pdf_pages(pdf_bytes, CHUNK_PAGES)
+        if len(chunks) > 1:
+            logger.info(f".:Splitting task {self.request.id} into {len(chunks)} chunks")
+            # Chunks report into this task's progress, each as one part
+            start_parts(self, self.request.id, [pdf_page_count(chunk) for chunk in chunks])
+            # Chunk blobs live under this task's id and are deleted by the merge
+            chunk_keys = [put_blob(chunk, f"chunks/{self.request.id}") for chunk in chunks]
+            # The chord keeps this task's id, so its merged result is what clients poll for
+            return self.replace(chord(
+                [
+                    translate_pdf_chunk_task.s(chunk_key, font_metadata, source_code, target_code,
+                                               self.request.id, part)
+                    for part, chunk_key in enumerate(chunk_keys)
+                ],
+                merge_pdf_chunks_task.s(cache_key, self.request.id, chunk_keys).on_error(
+                    release_pending_on_error.s(cache_key, self.request.id)
+                )
+            ))
+
+        result_bytes = process_pdf_bytes(
+            pdf_bytes=pdf_bytes,
+            font_metadata=font_metadata,
+            source_lang_code=source_code,
+            target_lang_code=target_code,
+            doc_id=doc_id,
+            progress=ProgressReporter(self, self.request.id),
+        )
+        result_key = put_blob(result_bytes, "results")
+        store_result(cache_key, result_key)
+        release_pending_task(cache_key, self.request.id)
+        return result_key
+    except Ignore:
+        # Replaced by the chord, whose errback releases the pending entry if a chunk or the merge fails
+        raise
+    except Exception:
+        # Identical requests would otherwise keep attaching to the failed task until the entry expires
+        release_pending_task(cache_key, self.request.id)
+        raise
+    finally:
+        delete_blobs([pdf_key])
+
+
+@celery_app.task(
+    bind=True,
+    name="pdf.translate_chunk",
+    autoretry_for=(Exception,),
+    max_retries=CHUNK_MAX_RETRIES,
+    retry_backoff=True,
+    retry_backoff_max=60,
+    retry_jitter=True,
+)
+def translate_pdf_chunk_task(
+    self,
+    chunk_key: str,
+    font_metadata: dict,
+    source_code: str,
+    target_code: str,
+    parent_task_id: str = None,
+    part: int = None,
+):
+    """
+    Translate one page chunk; a failed chunk is retried on its own.
+    Progress is reported as part of the task being polled (parent_task_id), and the translated
+    chunk is stored next to the chunk blobs of that task.
+    """
     result_bytes = process_pdf_bytes(
-        pdf_bytes=pdf_bytes,
+        pdf_bytes=get_blob(chunk_key),
         font_metadata=font_metadata,
         source_lang_code=source_code,
         target_lang_code=target_code,
+        doc_id=blob_digest(chunk_key),
+        progress=ProgressReporter(self, parent_task_id, part=part) if parent_task_id else None,
     )
-    return base64.b64encode(result_bytes).decode()
\ No newline at end of file
+    return put_blob(result_bytes, f"chunks/{parent_task_id}" if parent_task_id else "results")
+
+
+@celery_app.task(name="pdf.merge_chunks")
+def merge_pdf_chunks_task(chunk_result_keys: list, cache_key: str, task_id: str, chunk_keys: list = ()):
+    """
+    Chord callback: merge the translated chunks in page order, then delete the chunk blobs.
+    """
+    result_bytes = merge_pdfs([get_blob(key) for key in chunk_result_keys])
+    result_key = put_blob(result_bytes, "results")
+    store_result(cache_key, result_key)
+    release_pending_task(cache_key, task_id)
+    delete_blobs([*chunk_keys, *chunk_result_keys])
+    return result_key
+
+
+@celery_app.task(name="pdf.release_pending")
+def release_pending_on_error(request, exc, traceback, cache_key: str, task_id: str):
+    """
+    Errback of the chunk chord: release the pending entry of the failed task.
+    """
+    release_pending_task(cache_key, task_id)
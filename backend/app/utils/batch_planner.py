@@ -0,0 +1,126 @@
+# app/utils/batch_planner.py
+import os
+import re
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# Per-request budgets; the output budget stays well below the max_tokens=8192 of the completion call
+BATCH_INPUT_TOKEN_BUDGET = int(os.getenv("BATCH_INPUT_TOKEN_BUDGET", 2500))
+BATCH_OUTPUT_TOKEN_BUDGET = int(os.getenv("BATCH_OUTPUT_TOKEN_BUDGET", 5000))
+BATCH_MAX_SEGMENTS = int(os.getenv("BATCH_MAX_SEGMENTS", 40))
+# Translations into e.g. Vietnamese take noticeably more tokens than the English source
+OUTPUT_TOKEN_RATIO = float(os.getenv("OUTPUT_TOKEN_RATIO", 1.6))
+# Segments above this size are split at sentence boundaries and stitched back afterwards
+MAX_SEGMENT_TOKENS = int(os.getenv("MAX_SEGMENT_TOKENS", 800))
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;:])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate (about 4 characters per token) used for batching and rate limiting.
+    """
+    return _tokens_for_length(len(text))
+
+
+def _tokens_for_length(length: int) -> int:
+    return length // 4 + 1
+
+
+def split_segment(text: str, max_tokens: int = MAX_SEGMENT_TOKENS) -> list[str]:
+    """
+    Split an oversized segment into pieces of at most max_tokens, preferring sentence boundaries.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    # Sentences that are still too long are cut at word boundaries
+    units = []
+    for sentence in _SENTENCE_END_RE.split(text):
+        if estimate_tokens(sentence) <= max_tokens:
+            units.append(sentence)
+            continue
+        current = []
+        current_length = 0
+        for word in sentence.split():
+            if current and _tokens_for_length(current_length + 1 + len(word)) > max_tokens:
+                units.append(" ".join(current))
+                current = []
+                current_length = -1
+            current.append(word)
+            current_length += 1 + len(word)
+        if current:
+            units.append(" ".join(current))
+
+    # Greedily regroup sentences into pieces under the limit
+    pieces = []
+    current = ""
+    for unit in units:
+        candidate = f"{current} {unit}" if current else unit
+        if current and estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = unit
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+
+    return pieces
+
+
+def plan_batches(texts: list[str],
+                 input_token_budget: int = BATCH_INPUT_TOKEN_BUDGET,
+                 output_token_budget: int = BATCH_OUTPUT_TOKEN_BUDGET,
+                 max_segments: int = BATCH_MAX_SEGMENTS,
+                 max_segment_tokens: int = MAX_SEGMENT_TOKENS):
+    """
+    Pack texts into batches by estimated input and output tokens, keeping their order.
+
+    Returns (batches, pieces_per_text): batches is a list of lists of segments to translate,
+    pieces_per_text tells stitch_translations how many consecutive segments belong to each text.
+    """
+    # A single piece must always fit in an otherwise empty batch
+    max_segment_tokens = min(max_segment_tokens, input_token_budget, int(output_token_budget / OUTPUT_TOKEN_RATIO))
+
+    pieces = []
+    pieces_per_text = []
+    for text in texts:
+        text_pieces = split_segment(text, max_segment_tokens)
+        pieces.extend(text_pieces)
+        pieces_per_text.append(len(text_pieces))
+
+    batches = []
+    current = []
+    input_tokens = 0
+    for piece in pieces:
+        piece_tokens = estimate_tokens(piece)
+        fits = (
+            input_tokens + piece_tokens <= input_token_budget
+            and (input_tokens + piece_tokens) * OUTPUT_TOKEN_RATIO <= output_token_budget
+            and len(current) < max_segments
+        )
+        if current and not fits:
+            batches.append(current)
+            current = []
+            input_tokens = 0
+        current.append(piece)
+        input_tokens += piece_tokens
+    if current:
+        batches.append(current)
+
+    return batches, pieces_per_text
+
+
+def stitch_translations(batches_translated: list[list[str]], pieces_per_text: list[int]) -> list[str]:
+    """
+    Flatten translated batches and re-join the pieces of split segments.
+    """
+    flat = [piece for batch in batches_translated for piece in batch]
+    results = []
+    offset = 0
+    for count in pieces_per_text:
+        results.append(" ".join(p.strip() for p in flat[offset:offset + count]))
+        offset += count
+    return results
@@ -0,0 +1,248 @@
+# app/utils/blob_store.py
+import os
+import logging
+import tempfile
+from pathlib import Path
+from dotenv import load_dotenv
+from utils.content_hash import content_digest, new_hasher
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # only needed with BLOB_STORE=s3
+    boto3 = None
+
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# "local" keeps blobs in a directory shared by the API and the workers, "s3" in an S3-compatible bucket
+BLOB_STORE = os.getenv("BLOB_STORE", "local")
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "pdf-translator-blobs"))
+# S3 settings; S3_ENDPOINT_URL points at a local stand-in such as MinIO
+S3_BUCKET = os.getenv("S3_BUCKET", "pdf-translator")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+
+def blob_key(data: bytes, namespace: str) -> str:
+    """
+    Content-addressed key: identical bytes always map to the same blob.
+    """
+    return f"{namespace}/{content_digest(data)}"
+
+
+def blob_digest(key: str) -> str:
+    """
+    Content digest part of a blob key, used as the document id by the cache layers.
+    """
+    return key.rsplit("/", 1)[-1]
+
+
+class LocalBlobStore:
+    """
+    Blobs stored as files under a root directory.
+    """
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def spool_dir(self) -> Path:
+        # On the same filesystem as the blobs, so spooled files are moved in without copying
+        path = self.root / ".incoming"
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def local_path(self, key: str) -> Path:
+        return self._path(key)
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Writes to a temporary file first so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def put_file(self, key: str, file_path: str):
+        """
+        Move a spooled file into the store.
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(file_path, path)
+
+    def get(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def iter_chunks(self, key: str, chunk_size: int = BLOB_CHUNK_SIZE):
+        with open(self._path(key), "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def size(self, key: str) -> int:
+        return self._path(key).stat().st_size
+
+    def delete(self, key: str):
+        path = self._path(key)
+        path.unlink(missing_ok=True)
+        # Per-task directories (e.g. chunks/<task_id>/) go away with their last blob
+        if path.parent.parent != self.root:
+            try:
+                path.parent.rmdir()
+            except OSError:
+                pass
+
+    def iter_blobs(self):
+        """
+        Yield (key, modification time) of every stored blob, spooled and temporary files included.
+        """
+        for path in self.root.rglob("*"):
+            if path.is_file():
+                yield path.relative_to(self.root).as_posix(), path.stat().st_mtime
+
+
+class S3BlobStore:
+    """
+    Blobs stored as objects of an S3-compatible bucket.
+    """
+    def __init__(self, bucket: str, endpoint_url: str = None):
+        if boto3 is None:
+            raise RuntimeError("BLOB_STORE=s3 requires boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def spool_dir(self) -> str:
+        return tempfile.gettempdir()
+
+    def local_path(self, key: str):
+        return None
+
+    def put(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def put_file(self, key: str, file_path: str):
+        """
+        Upload a spooled file (multipart for large files) and remove it.
+        """
+        self.client.upload_file(file_path, self.bucket, key)
+        os.unlink(file_path)
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def iter_chunks(self, key: str, chunk_size: int = BLOB_CHUNK_SIZE):
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def iter_blobs(self):
+        """
+        Yield (key, modification time) of every object in the bucket.
+        """
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket):
+            for item in page.get("Contents", []):
+                yield item["Key"], item["LastModified"].timestamp()
+
+
+def create_blob_store(kind: str = BLOB_STORE):
+    if kind == "local":
+        return LocalBlobStore(BLOB_STORE_DIR)
+    if kind == "s3":
+        return S3BlobStore(S3_BUCKET, endpoint_url=S3_ENDPOINT_URL)
+    raise ValueError(f"Unknown BLOB_STORE: {kind}")
+
+
+blob_store = create_blob_store()
+
+
+def put_blob(data: bytes, namespace: str) -> str:
+    """
+    Store data once under its content-addressed key and return the key.
+    """
+    key = blob_key(data, namespace)
+    if not blob_store.exists(key):
+        blob_store.put(key, data)
+        logger.info(f"Stored blob {key} ({len(data)} bytes)")
+    return key
+
+
+def get_blob(key: str) -> bytes:
+    return blob_store.get(key)
+
+
+def delete_blobs(keys: list):
+    for key in keys:
+        try:
+            blob_store.delete(key)
+        except Exception as e:
+            logger.warning(f"Failed to delete blob {key}: {e}")
+
+
+class BlobWriter:
+    """
+    Spool a blob chunk by chunk to a temporary file while hashing it, so that large uploads never
+    sit in memory. commit() stores it under its content-addressed key; digest is then the document id.
+    """
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.digest = None
+        self.hash = new_hasher()
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=blob_store.spool_dir(), prefix=".tmp-")
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self.hash.update(chunk)
+        self.size += len(chunk)
+        self.file.write(chunk)
+
+    def commit(self) -> str:
+        self.file.close()
+        self.digest = self.hash.hexdigest()
+        key = f"{self.namespace}/{self.digest}"
+        if blob_store.exists(key):
+            os.unlink(self.tmp_path)
+        else:
+            blob_store.put_file(key, self.tmp_path)
+            logger.info(f"Stored blob {key} ({self.size} bytes)")
+        self.tmp_path = None
+        return key
+
+    def close(self):
+        """
+        Discard the spooled file if the blob was not committed.
+        """
+        self.file.close()
+        if self.tmp_path and os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
@@ -0,0 +1,51 @@
+# app/utils/content_hash.py
+import os
+import hashlib
+import logging
+from dotenv import load_dotenv
+
+try:
+    import blake3
+except ImportError:  # declared dependency; BLAKE2b keeps working without it
+    blake3 = None
+
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Digest identifying documents and blobs: "blake3" or "blake2b". It addresses shared blobs and cached
+# results, so only collision-resistant (cryptographic) hashes are accepted
+CONTENT_HASH = os.getenv("CONTENT_HASH", "blake3")
+
+
+def _resolve_algorithm(name: str) -> str:
+    if name not in ("blake3", "blake2b"):
+        raise ValueError(f"Unsupported CONTENT_HASH: {name} (use blake3 or blake2b)")
+    if name == "blake3" and blake3 is None:
+        logger.warning("CONTENT_HASH=blake3 but the blake3 package is not installed, using blake2b")
+        return "blake2b"
+    return name
+
+
+CONTENT_HASH_ALGORITHM = _resolve_algorithm(CONTENT_HASH)
+
+
+def new_hasher(algorithm: str = CONTENT_HASH_ALGORITHM):
+    """
+    Incremental hasher with update() and hexdigest(), for data that arrives in chunks.
+    """
+    if algorithm == "blake3":
+        # Hashes large updates on several threads
+        return blake3.blake3(max_threads=blake3.blake3.AUTO)
+    return hashlib.blake2b(digest_size=32)
+
+
+def content_digest(data: bytes, algorithm: str = CONTENT_HASH_ALGORITHM) -> str:
+    hasher = new_hasher(algorithm)
+    hasher.update(data)
+    return hasher.hexdigest()
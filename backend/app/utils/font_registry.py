@@ -0,0 +1,105 @@
+# app/utils/font_registry.py
+import logging
+from functools import lru_cache
+from threading import Lock
+import pymupdf
+from configs.font_config import FONT_PRESETS
+
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class FontMetrics:
+    """
+    A parsed font plus a per-character advance-width table measured at font size 1.
+
+    Exposes the same text_length/ascender/descender interface as pymupdf.Font, so it can be
+    passed wherever a font is only used for measuring.
+    """
+    def __init__(self, font_name: str, font_file_path: str):
+        self.font_name = font_name
+        self.font_file_path = font_file_path
+        self.font = pymupdf.Font(fontname=font_name, fontfile=font_file_path)
+        self.ascender = self.font.ascender
+        self.descender = self.font.descender
+        self.advances = {}
+        self.lock = Lock()
+
+    def char_advance(self, ch: str) -> float:
+        advance = self.advances.get(ch)
+        if advance is None:
+            with self.lock:
+                advance = self.font.text_length(ch, fontsize=1)
+            self.advances[ch] = advance
+        return advance
+
+    def unit_length(self, text: str) -> float:
+        """
+        Width of text at font size 1; widths scale linearly with the font size.
+        """
+        advances = self.advances
+        total = 0.0
+        for ch in text:
+            advance = advances.get(ch)
+            total += advance if advance is not None else self.char_advance(ch)
+        return total
+
+    def text_length(self, text: str, fontsize: float = 11) -> float:
+        return self.unit_length(text) * fontsize
+
+
+@lru_cache(maxsize=None)
+def get_font(font_name: str, font_file_path: str) -> FontMetrics:
+    """
+    Process-wide font registry: each font file is parsed once per worker.
+    """
+    return FontMetrics(font_name, font_file_path)
+
+
+def preload_fonts():
+    """
+    Parse every FONT_PRESETS font and warm its advance table with printable ASCII and Latin-1.
+    """
+    warmup = "".join(chr(cp) for cp in range(0x20, 0x250))
+    for preset in FONT_PRESETS.values():
+        for style in ("regular", "bold", "italic"):
+            try:
+                get_font(preset[f"{style}_font_name"], preset[f"{style}_font_file_path"]).unit_length(warmup)
+            except Exception as e:
+                logger.warning(f"Cannot preload font {preset[f'{style}_font_name']}: {e}")
+
+
+def _page_font_resource_path(doc, page):
+    """
+    Resolve the (xref, key prefix) of a page's /Resources/Font dictionary through indirect objects.
+    """
+    xref, prefix = page.xref, ""
+    for component in ("Resources", "Font"):
+        kind, value = doc.xref_get_key(xref, prefix + component)
+        if kind == "xref":
+            xref, prefix = int(value.split()[0]), ""
+        else:
+            prefix += component + "/"
+    return xref, prefix
+
+
+def insert_document_font(page, fontname: str, font_file_path: str) -> int:
+    """
+    Make fontname available on page, embedding the font file only once per document.
+
+    When the previous page already references the font, its xref is linked into this page's
+    resources instead of loading and embedding the font file again.
+    """
+    doc = page.parent
+    if page.number > 0:
+        for xref, _, _, _, refname, _ in doc.get_page_fonts(page.number - 1):
+            if refname == fontname:
+                resource_xref, prefix = _page_font_resource_path(doc, page)
+                doc.xref_set_key(resource_xref, prefix + fontname, f"{xref} 0 R")
+                return xref
+
+    return page.insert_font(fontname=fontname, fontfile=font_file_path)
@@ -0,0 +1,236 @@
+# app/utils/layout_codec.py
+import sys
+import json
+import zlib
+import struct
+import logging
+from collections.abc import Sequence
+
+try:
+    import msgpack
+except ImportError:  # declared dependency; compact JSON keeps working without it
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # declared dependency; zlib keeps working without it
+    zstandard = None
+
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Bump when the pruned page layout below changes; older cache entries are then ignored
+LAYOUT_FORMAT_VERSION = 1
+_MAGIC = b"PLC"
+# magic, format version, serializer, compressor, number of pages
+_HEADER = struct.Struct(">3sBBBI")
+_FRAME_LENGTH = struct.Struct(">I")
+
+SERIALIZER_JSON, SERIALIZER_MSGPACK = 0, 1
+COMPRESSOR_ZLIB, COMPRESSOR_ZSTD = 0, 1
+
+
+class LayoutDecodeError(ValueError):
+    pass
+
+
+def prune_layout(data: dict) -> dict:
+    """
+    Keep only what the pipeline reads from pymupdf4llm.to_json output: page number and size,
+    box class and bbox, and the text and color of every span.
+    """
+    return {
+        "pages": [
+            {
+                "page_number": page["page_number"],
+                "width": page["width"],
+                "height": page["height"],
+                "boxes": [
+                    {
+                        "boxclass": box["boxclass"],
+                        "x0": box["x0"], "y0": box["y0"], "x1": box["x1"], "y1": box["y1"],
+                        "textlines": [
+                            {"spans": [{"text": span.get("text", ""), "color": span.get("color", 0)}
+                                       for span in line.get("spans", [])]}
+                            for line in box.get("textlines") or []
+                        ]
+                    }
+                    for box in page["boxes"]
+                ]
+            }
+            for page in data["pages"]
+        ]
+    }
+
+
+def copy_layout(data: dict) -> dict:
+    """
+    Copy of a pruned layout that shares nothing mutable with data; much cheaper than copy.deepcopy.
+    """
+    return {
+        "pages": [
+            {
+                **page,
+                "boxes": [
+                    {**box, "textlines": [{"spans": [dict(span) for span in line["spans"]]} for line in box["textlines"]]}
+                    for box in page["boxes"]
+                ]
+            }
+            for page in data["pages"]
+        ]
+    }
+
+
+def layout_size(data: dict) -> int:
+    """
+    Memory held by a decoded, pruned layout in bytes (dicts, lists, strings and numbers; shared keys
+    not counted). About 30x its encoded size, so in-process caches are bounded by this instead.
+    """
+    pages = data["pages"]
+    size = sys.getsizeof(data) + sys.getsizeof(pages)
+    for page in pages:
+        size += (sys.getsizeof(page) + sys.getsizeof(page["boxes"]) + sys.getsizeof(page["page_number"])
+                 + sys.getsizeof(page["width"]) + sys.getsizeof(page["height"]))
+        for box in page["boxes"]:
+            size += (sys.getsizeof(box) + sys.getsizeof(box["boxclass"]) + sys.getsizeof(box["textlines"])
+                     + sys.getsizeof(box["x0"]) * 4)
+            for line in box["textlines"]:
+                size += sys.getsizeof(line) + sys.getsizeof(line["spans"])
+                for span in line["spans"]:
+                    size += sys.getsizeof(span) + sys.getsizeof(span["text"]) + sys.getsizeof(span["color"])
+    return size
+
+
+def _pack_page(page: dict) -> list:
+    # Positional lists instead of dicts: [page_number, width, height, [[boxclass, x0, y0, x1, y1, lines]]]
+    return [
+        page["page_number"], page["width"], page["height"],
+        [
+            [box["boxclass"], box["x0"], box["y0"], box["x1"], box["y1"],
+             [[[span["text"], span["color"]] for span in line["spans"]] for line in box["textlines"]]]
+            for box in page["boxes"]
+        ]
+    ]
+
+
+def _unpack_page(packed: list) -> dict:
+    page_number, width, height, boxes = packed
+    return {
+        "page_number": page_number,
+        "width": width,
+        "height": height,
+        "boxes": [
+            {
+                "boxclass": boxclass,
+                "x0": x0, "y0": y0, "x1": x1, "y1": y1,
+                "textlines": [{"spans": [{"text": text, "color": color} for text, color in line]} for line in lines]
+            }
+            for boxclass, x0, y0, x1, y1, lines in boxes
+        ]
+    }
+
+
+def _serialize(obj, serializer: int) -> bytes:
+    if serializer == SERIALIZER_MSGPACK:
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _deserialize(raw: bytes, serializer: int):
+    if serializer == SERIALIZER_MSGPACK:
+        if msgpack is None:
+            raise LayoutDecodeError("Layout was encoded with msgpack, which is not installed")
+        return msgpack.unpackb(raw, raw=False)
+    return json.loads(raw)
+
+
+def _compress(raw: bytes, compressor: int) -> bytes:
+    if compressor == COMPRESSOR_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def _decompress(frame: bytes, compressor: int) -> bytes:
+    if compressor == COMPRESSOR_ZSTD:
+        if zstandard is None:
+            raise LayoutDecodeError("Layout was compressed with zstd, which is not installed")
+        return zstandard.ZstdDecompressor().decompress(frame)
+    return zlib.decompress(frame)
+
+
+def encode_layout(data: dict) -> bytes:
+    """
+    Prune a layout and encode it as a versioned binary blob with one compressed frame per page.
+    """
+    serializer = SERIALIZER_MSGPACK if msgpack is not None else SERIALIZER_JSON
+    compressor = COMPRESSOR_ZSTD if zstandard is not None else COMPRESSOR_ZLIB
+
+    pages = prune_layout(data)["pages"]
+    frames = [_compress(_serialize(_pack_page(page), serializer), compressor) for page in pages]
+    return b"".join([
+        _HEADER.pack(_MAGIC, LAYOUT_FORMAT_VERSION, serializer, compressor, len(frames)),
+        *(_FRAME_LENGTH.pack(len(frame)) for frame in frames),
+        *frames
+    ])
+
+
+class LazyPages(Sequence):
+    """
+    Pages of an encoded layout, each decompressed and decoded on first access.
+    Decoded pages are kept, so in-place changes (e.g. box padding) persist.
+    A frame that fails to decode raises LayoutDecodeError.
+    """
+    def __init__(self, frames: list, serializer: int, compressor: int):
+        self.frames = frames
+        self.serializer = serializer
+        self.compressor = compressor
+        self.pages = [None] * len(frames)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __getitem__(self, ix):
+        if isinstance(ix, slice):
+            return [self[i] for i in range(*ix.indices(len(self)))]
+        page = self.pages[ix]
+        if page is None:
+            try:
+                raw = _decompress(self.frames[ix], self.compressor)
+                page = _unpack_page(_deserialize(raw, self.serializer))
+            except LayoutDecodeError:
+                raise
+            except Exception as e:
+                # zlib, zstd, msgpack and JSON errors alike, so a corrupt entry can be treated as a miss
+                raise LayoutDecodeError(f"Corrupt layout frame {ix}: {e}") from e
+            self.pages[ix] = page
+        return page
+
+
+def decode_layout(blob: bytes) -> dict:
+    """
+    Decode a blob from encode_layout into {"pages": LazyPages}. Only the frame index is read here.
+    """
+    if len(blob) < _HEADER.size:
+        raise LayoutDecodeError("Layout blob is truncated")
+    magic, version, serializer, compressor, page_count = _HEADER.unpack_from(blob)
+    if magic != _MAGIC or version != LAYOUT_FORMAT_VERSION:
+        raise LayoutDecodeError(f"Unsupported layout format {magic!r} v{version}")
+
+    offset = _HEADER.size
+    if len(blob) < offset + page_count * _FRAME_LENGTH.size:
+        raise LayoutDecodeError("Layout blob is truncated")
+    lengths = [_FRAME_LENGTH.unpack_from(blob, offset + i * _FRAME_LENGTH.size)[0] for i in range(page_count)]
+    offset += page_count * _FRAME_LENGTH.size
+
+    frames = []
+    for length in lengths:
+        frames.append(blob[offset:offset + length])
+        offset += length
+    if offset != len(blob):
+        raise LayoutDecodeError("Layout blob is truncated")
+
+    return {"pages": LazyPages(frames, serializer, compressor)}
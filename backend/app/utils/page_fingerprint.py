@@ -0,0 +1,93 @@
+# app/utils/page_fingerprint.py
+import re
+import hashlib
+import logging
+
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Bump when the fingerprint below changes; older per-page cache entries are then ignored
+PAGE_FINGERPRINT_VERSION = 1
+_REFERENCE = re.compile(rb"(\d+) 0 R")
+# Back references to the page tree would pull every other page into the fingerprint
+_PARENT_KEYS = re.compile(rb"/(?:Parent|P) \d+ 0 R")
+
+
+def _inherited_key(doc, xref: int, key: str):
+    # Resources, MediaBox, CropBox and Rotate may be set on an ancestor of the page
+    while xref:
+        kind, value = doc.xref_get_key(xref, key)
+        if kind != "null":
+            return kind, value
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        xref = int(parent.split()[0]) if kind == "xref" else 0
+    return "null", "null"
+
+
+class PageFingerprinter:
+    """
+    Content fingerprints of the pages of one open document: a hash of each page's content streams,
+    the objects reachable from its resources, and its geometry.
+
+    Object numbers are replaced by their order of discovery, so a re-saved document whose objects
+    were renumbered keeps the same fingerprints. Stream digests are computed once per document,
+    so shared fonts and images are hashed only once.
+    """
+    def __init__(self, doc):
+        self.doc = doc
+        self.stream_digests = {}
+
+    def _stream_digest(self, xref: int) -> bytes:
+        digest = self.stream_digests.get(xref)
+        if digest is None:
+            raw = self.doc.xref_stream_raw(xref) if self.doc.xref_is_stream(xref) else b""
+            digest = self.stream_digests[xref] = hashlib.blake2b(raw or b"", digest_size=16).digest()
+        return digest
+
+    def _normalize(self, source: bytes, ids: dict) -> tuple[bytes, list]:
+        # References are written as discovery indices instead of object numbers
+        source = _PARENT_KEYS.sub(b"", source)
+        refs = [int(ref) for ref in _REFERENCE.findall(source)]
+        normalized = _REFERENCE.sub(lambda match: b"#%d" % ids.setdefault(int(match.group(1)), len(ids)), source)
+        return normalized, refs
+
+    def _walk(self, roots: list, ids: dict, page_hash):
+        visited = set()
+        stack = list(reversed(roots))
+        while stack:
+            xref = stack.pop()
+            if xref in visited or not 0 < xref < self.doc.xref_length():
+                continue
+            visited.add(xref)
+            source = self.doc.xref_object(xref, compressed=True).encode("latin-1", "replace")
+            normalized, refs = self._normalize(source, ids)
+            page_hash.update(b"#%d:" % ids.setdefault(xref, len(ids)))
+            page_hash.update(normalized)
+            page_hash.update(self._stream_digest(xref))
+            stack.extend(reversed(refs))
+
+    def fingerprint(self, page_number: int) -> str:
+        page = self.doc[page_number]
+        page_hash = hashlib.blake2b(digest_size=16)
+        page_hash.update(f"v{PAGE_FINGERPRINT_VERSION}".encode())
+        for key in ("MediaBox", "CropBox", "Rotate"):
+            page_hash.update(repr(_inherited_key(self.doc, page.xref, key)).encode())
+
+        ids = {}
+        roots = list(page.get_contents())
+        for xref in roots:
+            ids.setdefault(xref, len(ids))
+        kind, resources = _inherited_key(self.doc, page.xref, "Resources")
+        # Either a reference or an inline dictionary; both are hashed with normalized references
+        normalized, refs = self._normalize(resources.encode("latin-1", "replace"), ids)
+        page_hash.update(normalized)
+
+        self._walk(roots + refs, ids, page_hash)
+        return page_hash.hexdigest()
+
+    def fingerprints(self, page_numbers) -> list[str]:
+        return [self.fingerprint(page_number) for page_number in page_numbers]
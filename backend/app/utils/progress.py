@@ -0,0 +1,180 @@
+# app/utils/progress.py
+import os
+import json
+import time
+import logging
+from threading import Lock
+from dotenv import load_dotenv
+from utils.redis_cache import redis_client, guarded_call
+
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Celery state of a running translation that has reported progress
+PROGRESS_STATE = "PROGRESS"
+# Pipeline stages, in the order a page window goes through them
+STAGES = ("layout", "figures", "translation", "render")
+# Page and batch events closer together than this are coalesced; stage changes are always sent
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", 0.5))
+PROGRESS_TTL = 60 * 60
+
+
+def progress_channel(task_id: str) -> str:
+    """
+    Redis pub/sub channel carrying the progress events of task_id as JSON.
+    """
+    return f"progress:{task_id}"
+
+
+def _parts_key(task_id: str) -> str:
+    return f"progress:{task_id}:parts"
+
+
+def _estimate_eta(started_at: float, pages_done: int, pages_total: int):
+    if not pages_done or not pages_total:
+        return None
+    elapsed = time.time() - started_at
+    return round(elapsed / pages_done * (pages_total - pages_done), 1)
+
+
+class ProgressReporter:
+    """
+    Progress of one pipeline run: current stage, pages and translation batches done, and an ETA.
+    Events are stored as the meta of task_id (state PROGRESS) and published on progress_channel(task_id).
+
+    A run with part set is one chunk of task_id: every chunk keeps its counters in a Redis hash,
+    and the events of task_id add up all chunks.
+    """
+    def __init__(self, task, task_id: str, pages_total: int = 0, part: int = None,
+                 min_interval: float = PROGRESS_MIN_INTERVAL):
+        self.task = task
+        self.task_id = task_id
+        self.part = part
+        self.min_interval = min_interval
+        self.lock = Lock()
+        self.last_sent = 0.0
+        self.started_at = time.time()
+        self.stage = None
+        self.pages_done = 0
+        self.pages_total = pages_total
+        self.batches_done = 0
+        self.batches_total = 0
+
+    def set_stage(self, stage: str):
+        with self.lock:
+            if stage == self.stage:
+                return
+            self.stage = stage
+            self._send(force=True)
+
+    def set_pages_total(self, pages_total: int):
+        with self.lock:
+            self.pages_total = pages_total
+
+    def pages_completed(self, count: int):
+        with self.lock:
+            self.pages_done += count
+            # The last page is always reported; with no known total every page would be "the last"
+            self._send(force=self.pages_total > 0 and self.pages_done >= self.pages_total)
+
+    def batches_planned(self, count: int):
+        with self.lock:
+            self.batches_total += count
+            self._send()
+
+    def batch_completed(self):
+        # Called from the translation threads
+        with self.lock:
+            self.batches_done += 1
+            self._send()
+
+    def snapshot(self) -> dict:
+        return {
+            "stage": self.stage,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "batches_done": self.batches_done,
+            "batches_total": self.batches_total,
+            "started_at": self.started_at,
+        }
+
+    def _send(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_sent < self.min_interval:
+            return
+        self.last_sent = now
+
+        event = self.snapshot() if self.part is None else self._combine_parts()
+        if event is None:
+            return
+        event["eta_seconds"] = _estimate_eta(event["started_at"], event["pages_done"], event["pages_total"])
+        publish_progress(self.task, self.task_id, event)
+
+    def _combine_parts(self):
+        def call():
+            pipe = redis_client.pipeline()
+            pipe.hset(_parts_key(self.task_id), str(self.part), json.dumps(self.snapshot()))
+            pipe.expire(_parts_key(self.task_id), PROGRESS_TTL)
+            pipe.hgetall(_parts_key(self.task_id))
+            return pipe.execute()[-1]
+        parts = guarded_call("progress", call, default=None)
+        if not parts:
+            return None
+        return combine_progress([json.loads(part) for part in parts.values()])
+
+
+def combine_progress(parts: list[dict]) -> dict:
+    """
+    Progress of a chunked task: counters are summed, and the stage is that of the least advanced chunk.
+    """
+    unfinished = [part for part in parts if part["pages_done"] < part["pages_total"]]
+    stages = [part["stage"] for part in unfinished if part["stage"] in STAGES]
+    return {
+        "stage": min(stages, key=STAGES.index) if stages else ("render" if not unfinished else None),
+        "pages_done": sum(part["pages_done"] for part in parts),
+        "pages_total": sum(part["pages_total"] for part in parts),
+        "batches_done": sum(part["batches_done"] for part in parts),
+        "batches_total": sum(part["batches_total"] for part in parts),
+        "started_at": min(part["started_at"] for part in parts),
+    }
+
+
+def start_parts(task, task_id: str, pages_per_part: list[int]):
+    """
+    Register the chunks of task_id before they are dispatched, so totals are known from the start.
+    """
+    started_at = time.time()
+    parts = {
+        str(part): json.dumps({"stage": None, "pages_done": 0, "pages_total": pages_total,
+                               "batches_done": 0, "batches_total": 0, "started_at": started_at})
+        for part, pages_total in enumerate(pages_per_part)
+    }
+
+    def call():
+        pipe = redis_client.pipeline()
+        pipe.delete(_parts_key(task_id))
+        pipe.hset(_parts_key(task_id), mapping=parts)
+        pipe.expire(_parts_key(task_id), PROGRESS_TTL)
+        pipe.execute()
+    guarded_call("progress", call)
+
+    event = combine_progress([json.loads(part) for part in parts.values()])
+    event["eta_seconds"] = None
+    publish_progress(task, task_id, event)
+
+
+def publish_progress(task, task_id: str, event: dict):
+    """
+    Store event as the PROGRESS meta of task_id and publish it on its channel.
+    """
+    try:
+        task.update_state(task_id=task_id, state=PROGRESS_STATE, meta=event)
+    except Exception as e:
+        logger.warning(f"Failed to store progress of task {task_id}: {e}")
+    guarded_call("publish", lambda: redis_client.publish(progress_channel(task_id), json.dumps(event)))
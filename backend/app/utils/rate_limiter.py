@@ -0,0 +1,138 @@
+# app/utils/rate_limiter.py
+import math
+import time
+import logging
+from threading import Lock
+from utils.redis_cache import redis_client, guarded_call
+
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_NAMESPACE = "rate_limit"
+
+# Both buckets of a limiter and its pause live in one hash, updated atomically with the Redis server clock.
+# ARGV: rate (per second), capacity and amount of the request bucket, the same for the token bucket,
+# a pause in seconds (0 to take from the buckets) and the key's expiry.
+# Returns the seconds the caller must wait, as a string since Lua numbers are truncated to integers
+_RESERVE_SHARED = redis_client.register_script("""
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'updated_at', 'blocked_until')
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+local blocked_until = tonumber(state[4]) or 0
+local pause = tonumber(ARGV[7])
+if pause > 0 then
+    blocked_until = math.max(blocked_until, now + pause)
+end
+local wait = math.max(0, blocked_until - now)
+local levels = {}
+for i = 1, 2 do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local capacity = tonumber(ARGV[3 * i - 1])
+    local level = math.min(capacity, (tonumber(state[i]) or capacity) + elapsed * rate)
+    if pause > 0 then
+        level = math.min(level, 0)
+    else
+        level = level - math.min(tonumber(ARGV[3 * i]), capacity)
+        if level < 0 then
+            wait = math.max(wait, -level / rate)
+        end
+    end
+    levels[i] = level
+end
+redis.call('HSET', KEYS[1], 'requests', levels[1], 'tokens', levels[2], 'updated_at', now,
+           'blocked_until', blocked_until)
+redis.call('EXPIRE', KEYS[1], ARGV[8])
+return tostring(wait)
+""")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` tokens per minute.
+    """
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` tokens and return how long the caller must wait before using them.
+        """
+        # A request larger than the bucket would never fit, so it is charged a full bucket
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def drain(self):
+        """
+        Empty the bucket, used when the provider reports that the quota is exhausted.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budget of one provider account. The buckets are kept in
+    Redis under `name`, so every translation thread of every worker draws from the same quota.
+    While Redis is unavailable each process falls back to its own buckets.
+    """
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, name: str = "default"):
+        self.key = f"{RATE_LIMIT_NAMESPACE}:{name}"
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+        self.lock = Lock()
+        # An idle key expires once both buckets would have refilled, which is the same as a full bucket
+        self.refill_seconds = max(bucket.capacity / bucket.rate for bucket in (self.requests, self.tokens))
+
+    def _reserve_shared(self, tokens: int, pause: float = 0.0):
+        args = [
+            self.requests.rate, self.requests.capacity, 1,
+            self.tokens.rate, self.tokens.capacity, tokens,
+            pause, math.ceil(self.refill_seconds + pause) + 60,
+        ]
+        wait = guarded_call("rate_limit", lambda: _RESERVE_SHARED(keys=[self.key], args=args))
+        return None if wait is None else float(wait)
+
+    def acquire(self, tokens: int = 0):
+        """
+        Block until one request carrying about `tokens` tokens fits into the budget.
+        """
+        wait = self._reserve_shared(tokens)
+        if wait is None:
+            wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+            with self.lock:
+                wait = max(wait, self.blocked_until - time.monotonic())
+        if wait > 0:
+            logger.info(f"Rate limit: waiting {wait:.2f}s")
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Stop every caller for `seconds`, e.g. after a 429 response with a Retry-After header.
+        """
+        self._reserve_shared(0, pause=seconds)
+        # The local buckets are paused as well, in case Redis becomes unavailable meanwhile
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.requests.drain()
+        self.tokens.drain()
@@ -1,10 +1,16 @@
 # app/utils/redis_cache.py
-import hashlib
+import copy
 import json
+import time
 import logging
 from functools import wraps
+from utils.content_hash import content_digest
+from collections import OrderedDict
+from queue import LifoQueue, Empty
+from threading import Lock
 from typing import Callable, Any
-from redis import Redis
+from redis import Redis, BlockingConnectionPool
+from redis.exceptions import RedisError, LockError, ConnectionError as RedisConnectionError
 import os
 from dotenv import load_dotenv
 
@@ -18,24 +24,276 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-redis_client = Redis.from_url(
-    url=os.getenv("REDIS_URL", "redis://localhost:6379/1"),
-    decode_responses=True,
-    socket_connect_timeout=5,
-    socket_timeout=5
-)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/1")
+# Connections per pool and per process; callers wait up to REDIS_POOL_TIMEOUT for a free one
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 32))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 2))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+# Consecutive failures that open the circuit, and how long the cache is skipped before retrying
+REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", 3))
+REDIS_BREAKER_COOLDOWN = float(os.getenv("REDIS_BREAKER_COOLDOWN", 30))
+
+
+class PoolTimeoutError(RedisConnectionError):
+    """
+    No pooled connection became free within REDIS_POOL_TIMEOUT: this process is busy, Redis may be fine.
+    """
+
+
+class _CheckoutQueue(LifoQueue):
+    # BlockingConnectionPool raises a plain ConnectionError when a checkout times out, the same
+    # error as an unreachable server; a distinct one keeps pool waits out of the circuit breaker
+    def get(self, block=True, timeout=None):
+        try:
+            return super().get(block, timeout)
+        except Empty:
+            raise PoolTimeoutError("No connection available.") from None
+
+
+def _create_pool(decode_responses: bool) -> BlockingConnectionPool:
+    return BlockingConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        queue_class=_CheckoutQueue,
+        decode_responses=decode_responses,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT
+    )
+
+
+redis_client = Redis(connection_pool=_create_pool(decode_responses=True))
+# Same database without response decoding, for binary cache values
+binary_redis_client = Redis(connection_pool=_create_pool(decode_responses=False))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive Redis errors; while open the cache is skipped, and after
+    `cooldown` seconds a single call is let through to probe whether Redis is back.
+    """
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release_probe(self):
+        # The probe call ended without reaching Redis, so the next call may probe instead
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.probing or self.consecutive_failures >= self.failures:
+                if self.opened_at is None or self.probing:
+                    logger.warning(f"Redis unhealthy, skipping the cache for {self.cooldown}s")
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            return "closed" if self.opened_at is None else "open"
+
+
+class CacheStats:
+    """
+    Per-process cache counters: hits, misses, errors, calls skipped by the circuit breaker,
+    and latency per Redis operation.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {"hits": 0, "misses": 0, "errors": 0, "skipped": 0, "local_hits": 0}
+            self.latency = {}
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def observe(self, operation: str, seconds: float):
+        with self.lock:
+            calls, total, slowest = self.latency.get(operation, (0, 0.0, 0.0))
+            self.latency[operation] = (calls + 1, total + seconds, max(slowest, seconds))
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                **self.counters,
+                "latency_ms": {
+                    operation: {"calls": calls, "avg": total / calls * 1000, "max": slowest * 1000}
+                    for operation, (calls, total, slowest) in self.latency.items()
+                }
+            }
+
+
+circuit_breaker = CircuitBreaker(REDIS_BREAKER_FAILURES, REDIS_BREAKER_COOLDOWN)
+cache_stats = CacheStats()
+
+
+def guarded_call(operation: str, call: Callable, default: Any = None) -> Any:
+    """
+    Run a Redis call through the circuit breaker, recording its latency. Returns default when
+    the circuit is open or the call fails. Waiting too long for a pooled connection counts as
+    an error but not as a breaker failure; any other exception is raised to the caller.
+    """
+    if not circuit_breaker.allow():
+        cache_stats.count("skipped")
+        return default
+
+    start = time.perf_counter()
+    try:
+        result = call()
+    except PoolTimeoutError as e:
+        cache_stats.observe(operation, time.perf_counter() - start)
+        cache_stats.count("errors")
+        # Nothing is known about Redis itself; a probe that was let through may be retried
+        circuit_breaker.release_probe()
+        logger.warning(f"Redis {operation} skipped, connection pool exhausted: {e}")
+        return default
+    except RedisError as e:
+        cache_stats.observe(operation, time.perf_counter() - start)
+        cache_stats.count("errors")
+        circuit_breaker.record_failure()
+        logger.warning(f"Redis {operation} failed: {e}")
+        return default
+    except Exception:
+        cache_stats.observe(operation, time.perf_counter() - start)
+        # Not a Redis failure, but a probe must not stay taken or the circuit would never close again
+        circuit_breaker.release_probe()
+        raise
+
+    cache_stats.observe(operation, time.perf_counter() - start)
+    circuit_breaker.record_success()
+    return result
+
+
+def cache_get_many(keys: list, client: Redis = redis_client) -> list:
+    """
+    MGET keys in one round trip. Returns a list aligned with keys, None for misses.
+    """
+    if not keys:
+        return []
+    values = guarded_call("mget", lambda: client.mget(keys), default=[None] * len(keys))
+    hits = sum(value is not None for value in values)
+    cache_stats.count("hits", hits)
+    cache_stats.count("misses", len(keys) - hits)
+    return values
+
+
+def cache_set_many(mapping: dict, ttl: int, client: Redis = redis_client) -> bool:
+    """
+    SETEX every entry of mapping in one pipelined round trip (MSET cannot set a TTL).
+    """
+    if not mapping:
+        return True
+
+    def call():
+        pipe = client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.setex(key, ttl, value)
+        return pipe.execute()
+
+    return guarded_call("set_many", call) is not None
+
+
+def get_cache_stats() -> dict:
+    return {"circuit": circuit_breaker.state, **cache_stats.snapshot()}
+
 
 CACHE_TTL = 60 * 60 * 24 * 7  # 7 ngày (có thể config qua env)
+# Upper bound for one computation holding the single-flight lock, and for waiting on it
+CACHE_LOCK_TIMEOUT = int(os.getenv("CACHE_LOCK_TIMEOUT", 600))
+
+class LocalCache:
+    """
+    In-process LRU of decoded cache values, bounded by the total of their charged sizes in bytes.
+    Entries expire together with their Redis copy.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, _, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float, size: int):
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, size, time.monotonic() + ttl)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: str):
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
 
-def cache_by_checksum(ttl: int = CACHE_TTL, namespace: str = "pdf_layout") -> Callable:
+
+def _json_dumps(result: dict) -> str:
+    return json.dumps(result, ensure_ascii=False)
+
+
+def cache_by_checksum(ttl: int = CACHE_TTL, namespace: str = "pdf_layout",
+                      dumps: Callable = _json_dumps, loads: Callable = json.loads,
+                      local_cache_bytes: int = 0, copy_value: Callable = copy.deepcopy,
+                      value_size: Callable = None) -> Callable:
     """
     Decorator để cache kết quả function dựa trên checksum của input bytes (pdf_bytes).
     
     - Áp dụng cho function nhận pdf_bytes làm arg đầu tiên.
     - Cache dict/JSON (như layout data từ pymupdf4llm).
-    - Key: f"{namespace}:{checksum}"
+    - Key: f"{namespace}:{checksum}"; keyword doc_id (digest đã tính khi upload) được dùng làm
+      checksum nếu có, để không phải hash lại pdf_bytes.
+    - Các keyword argument khác (ví dụ page window) được thêm vào cuối key.
+    - Single-flight: khi cache miss, chỉ một worker được tính cho mỗi key (Redis lock),
+      các worker khác chờ rồi đọc kết quả từ cache.
+    - dumps/loads: định dạng lưu trong Redis (mặc định JSON), ví dụ encode_layout/decode_layout.
+    - local_cache_bytes > 0: thêm cache L1 trong process (LRU theo dung lượng, hết hạn cùng lúc
+      với Redis); Redis là L2 dùng chung giữa các worker.
+    - L1 giữ object đã decode; mỗi lần hit trả về copy_value(object), để caller sửa tại chỗ mà không làm
+      hỏng cache. Dung lượng mỗi entry là value_size(object) (bộ nhớ ước tính của object đã decode, tính
+      một lần khi thêm vào), mặc định là độ dài bản serialized.
     """
     def decorator(func: Callable) -> Callable:
+        local_cache = LocalCache(local_cache_bytes) if local_cache_bytes > 0 else None
+
         @wraps(func)
         def wrapper(*args, **kwargs) -> Any:
             pdf_bytes = kwargs.get("pdf_bytes")
@@ -46,37 +304,107 @@ def cache_by_checksum(ttl: int = CACHE_TTL, namespace: str = "pdf_layout") -> Ca
             elif not isinstance(pdf_bytes, bytes):
                 raise ValueError("pdf_bytes must be bytes")
                 
-            # Calculate checksum of pdf_bytes
-            checksum = hashlib.md5(pdf_bytes).hexdigest() 
+            # Reuses the document id when the caller has one, otherwise hashes pdf_bytes
+            checksum = kwargs.get("doc_id") or content_digest(pdf_bytes)
             cache_key = f"{namespace}:{checksum}"
 
+            # Other keyword arguments (e.g. a page window) are part of the key
+            extra_kwargs = {k: v for k, v in kwargs.items() if k not in ("pdf_bytes", "doc_id")}
+            if extra_kwargs:
+                cache_key += ":" + ",".join(f"{k}={v}" for k, v in sorted(extra_kwargs.items()))
+
             logger.info(f"Checking cache for key: {cache_key}")
 
+            # L1 hit: the decoded value is kept, and every caller gets its own copy
+            if local_cache is not None:
+                cached = local_cache.get(cache_key)
+                if cached is not None:
+                    cache_stats.count("local_hits")
+                    return copy_value(cached)
+
             # Cache hit: Get layout data from Redis
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                try:
-                    result = json.loads(cached_data)
-                    logger.info(f"Cache hit for {cache_key} – Skipping expensive computation")
-                    return result
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Invalid cached data for {cache_key}: {e}")
-
-            # Cache miss: Run the detect layout function
-            logger.info(f"Cache miss for {cache_key} – Running {func.__name__}")
-            result = func(*args, **kwargs)
-
-            # Save to cache (if result is dict/JSON serializable)
-            if isinstance(result, dict):
-                try:
-                    redis_client.setex(cache_key, ttl, json.dumps(result, ensure_ascii=False))
-                    logger.info(f"Cached result for {cache_key} (TTL: {ttl}s)")
-                except Exception as e:
-                    logger.warning(f"Failed to cache result: {e}")
-            else:
-                logger.warning(f"Result not serializable (not dict) – No cache")
-
-            return result
+            result = _get_cached(cache_key, loads, local_cache, copy_value, value_size)
+            if result is not None:
+                return result
+
+            # Only one worker computes a given key; the others wait for the lock and re-read the cache
+            lock = redis_client.lock(f"lock:{cache_key}", timeout=CACHE_LOCK_TIMEOUT,
+                                     blocking_timeout=CACHE_LOCK_TIMEOUT)
+            acquired = guarded_call("lock", lock.acquire, default=False)
+            try:
+                if acquired:
+                    result = _get_cached(cache_key, loads, local_cache, copy_value, value_size)
+                    if result is not None:
+                        return result
+                return _compute_and_cache(func, args, kwargs, cache_key, ttl, dumps, local_cache, copy_value,
+                                          value_size)
+            finally:
+                if acquired:
+                    guarded_call("unlock", lambda: _release_lock(lock))
 
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def _release_lock(lock):
+    try:
+        lock.release()
+    except LockError as e:
+        # The lock expired while computing; not a sign of an unhealthy Redis
+        logger.warning(f"Lock {lock.name} expired before release: {e}")
+
+
+def _set_local(local_cache: LocalCache, cache_key: str, value, ttl: float, cached_data: bytes,
+               value_size: Callable = None):
+    # Charged once here: the decoded value, not its (compressed) serialized form, is what L1 holds
+    size = value_size(value) if value_size is not None else len(cached_data)
+    local_cache.set(cache_key, value, ttl, size)
+
+
+def _get_cached(cache_key: str, loads: Callable, local_cache: LocalCache = None,
+                copy_value: Callable = copy.deepcopy, value_size: Callable = None):
+    if local_cache is None:
+        cached_data = cache_get_many([cache_key], client=binary_redis_client)[0]
+        remaining_ttl = None
+    else:
+        # Reads the remaining TTL in the same round trip so the L1 copy expires with Redis
+        def call():
+            pipe = binary_redis_client.pipeline(transaction=False)
+            pipe.get(cache_key)
+            pipe.pttl(cache_key)
+            return pipe.execute()
+        cached_data, remaining_ttl = guarded_call("get_ttl", call, default=(None, None))
+        cache_stats.count("hits" if cached_data is not None else "misses")
+
+    if cached_data:
+        try:
+            result = loads(cached_data)
+            logger.info(f"Cache hit for {cache_key} – Skipping expensive computation")
+        except ValueError as e:
+            logger.warning(f"Invalid cached data for {cache_key}: {e}")
+            return None
+        if local_cache is not None and remaining_ttl and remaining_ttl > 0:
+            # The caller may change result in place, so L1 keeps a copy
+            _set_local(local_cache, cache_key, copy_value(result), remaining_ttl / 1000, cached_data, value_size)
+        return result
+    return None
+
+
+def _compute_and_cache(func: Callable, args, kwargs, cache_key: str, ttl: int, dumps: Callable,
+                       local_cache: LocalCache = None, copy_value: Callable = copy.deepcopy,
+                       value_size: Callable = None):
+    # Cache miss: Run the detect layout function
+    logger.info(f"Cache miss for {cache_key} – Running {func.__name__}")
+    result = func(*args, **kwargs)
+
+    # Save to cache (if result is dict/JSON serializable)
+    if isinstance(result, dict):
+        cached_data = dumps(result)
+        if local_cache is not None:
+            _set_local(local_cache, cache_key, copy_value(result), ttl, cached_data, value_size)
+        if cache_set_many({cache_key: cached_data}, ttl, client=binary_redis_client):
+            logger.info(f"Cached result for {cache_key} (TTL: {ttl}s)")
+    else:
+        logger.warning(f"Result not serializable (not dict) – No cache")
+
+    return result
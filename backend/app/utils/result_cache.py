@@ -0,0 +1,279 @@
+# app/utils/result_cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+from dotenv import load_dotenv
+from celery_app import celery_app
+from utils.redis_cache import redis_client, guarded_call
+from utils.blob_store import blob_store
+
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Entries not hit for this long are evicted together with their result blob
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 60 * 60 * 24 * 7))  # 7 days
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1000))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 5 * 1024 ** 3))  # 5 GB
+RESULT_CACHE_NAMESPACE = "result_cache"
+# A pending task is forgotten after this long, e.g. when its worker was killed
+PENDING_TASK_TTL = int(os.getenv("PENDING_TASK_TTL", 60 * 30))
+# Celery task results keep pointing at a result blob for this long after it was handed out
+RESULT_BLOB_GRACE = int(celery_app.conf.result_expires)
+# Once the owner's Celery result has expired its state reads PENDING, so requests attaching to it would wait forever
+if PENDING_TASK_TTL >= RESULT_BLOB_GRACE:
+    raise ValueError(f"PENDING_TASK_TTL ({PENDING_TASK_TTL}s) must be shorter than result_expires ({RESULT_BLOB_GRACE}s)")
+EVICT_BATCH = 100
+# Uploads and chunks (and interrupted spool files) left behind by tasks that never finished
+BLOB_STALE_AFTER = int(os.getenv("BLOB_STALE_AFTER", 60 * 60 * 24))
+BLOB_SWEEP_INTERVAL = int(os.getenv("BLOB_SWEEP_INTERVAL", 60 * 10))
+
+# Result blob per entry, last access time per entry (LRU order), result size per entry and their total
+_RESULTS_KEY = f"{RESULT_CACHE_NAMESPACE}:results"
+_LRU_KEY = f"{RESULT_CACHE_NAMESPACE}:lru"
+_SIZES_KEY = f"{RESULT_CACHE_NAMESPACE}:sizes"
+_TOTAL_BYTES_KEY = f"{RESULT_CACHE_NAMESPACE}:total_bytes"
+# Result blobs of evicted entries, by the last time they were handed out; deleted once unreferenced
+_RELEASED_KEY = f"{RESULT_CACHE_NAMESPACE}:released"
+# Held while a process sweeps the blob store, so sweeps run at most once per interval
+_SWEEP_KEY = f"{RESULT_CACHE_NAMESPACE}:sweep"
+
+# Deletes a pending entry only if it still names the given task, in a single atomic step
+_RELEASE_PENDING = redis_client.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+""")
+
+
+def result_cache_key(doc_id: str, source_lang_code: str, target_lang_code: str,
+                     font_metadata: dict, pipeline_version: str) -> str:
+    """
+    Digest of everything that determines the translated PDF: input content (its document id),
+    language pair, font preset and pipeline version.
+    """
+    settings = json.dumps(
+        [doc_id, source_lang_code, target_lang_code, font_metadata, pipeline_version],
+        sort_keys=True
+    )
+    return hashlib.sha256(settings.encode("utf-8")).hexdigest()
+
+
+def lookup_result(cache_key: str):
+    """
+    Return the blob key of a cached translated PDF, or None. A hit renews the entry's idle timeout.
+    """
+    def call():
+        pipe = redis_client.pipeline()
+        pipe.hget(_RESULTS_KEY, cache_key)
+        pipe.zadd(_LRU_KEY, {cache_key: time.time()}, xx=True)
+        return pipe.execute()[0]
+
+    result_key = guarded_call("result_lookup", call)
+    if result_key is None:
+        return None
+
+    # The blob store is checked outside the circuit breaker, which only judges Redis; its errors are a miss
+    try:
+        found = blob_store.exists(result_key)
+    except Exception as e:
+        logger.warning(f"Result cache lookup failed: {e}")
+        return None
+    if not found:
+        guarded_call("result_evict", lambda: _evict([cache_key]))
+        return None
+    return result_key
+
+
+def store_result(cache_key: str, result_key: str):
+    """
+    Remember result_key for cache_key, then evict idle and least recently used entries over the limits.
+    """
+    try:
+        size = blob_store.size(result_key)
+    except Exception as e:
+        logger.warning(f"Failed to cache result: {e}")
+        return
+
+    def call():
+        now = time.time()
+        old_result_key = redis_client.hget(_RESULTS_KEY, cache_key)
+        old_size = redis_client.hget(_SIZES_KEY, cache_key) if old_result_key is not None else None
+
+        pipe = redis_client.pipeline()
+        pipe.hset(_RESULTS_KEY, cache_key, result_key)
+        pipe.hset(_SIZES_KEY, cache_key, size)
+        pipe.zadd(_LRU_KEY, {cache_key: now})
+        pipe.incrby(_TOTAL_BYTES_KEY, size - int(old_size or 0))
+        pipe.zrem(_RELEASED_KEY, result_key)
+        if old_result_key is not None and old_result_key != result_key:
+            pipe.zadd(_RELEASED_KEY, {old_result_key: now})
+        pipe.execute()
+        enforce_limits()
+        return redis_client.set(_SWEEP_KEY, 1, nx=True, ex=BLOB_SWEEP_INTERVAL)
+
+    # Only Redis work runs inside the circuit breaker; the blob store is cleaned up afterwards
+    sweep_due = guarded_call("result_store", call)
+    try:
+        purge_released_results()
+        if sweep_due:
+            sweep_blobs()
+    except Exception as e:
+        logger.warning(f"Blob cleanup failed: {e}")
+
+
+def enforce_limits():
+    """
+    Evict entries idle for longer than the TTL, then the least recently used ones until the
+    entry count and total result size fit the limits. Their blobs are deleted by purge_released_results.
+    """
+    _evict(redis_client.zrangebyscore(_LRU_KEY, "-inf", time.time() - RESULT_CACHE_TTL))
+
+    count = redis_client.zcard(_LRU_KEY)
+    if count > RESULT_CACHE_MAX_ENTRIES:
+        _evict(redis_client.zrange(_LRU_KEY, 0, count - RESULT_CACHE_MAX_ENTRIES - 1))
+
+    excess = int(redis_client.get(_TOTAL_BYTES_KEY) or 0) - RESULT_CACHE_MAX_BYTES
+    while excess > 0:
+        candidates = redis_client.zrange(_LRU_KEY, 0, EVICT_BATCH - 1)
+        if not candidates:
+            # Nothing left to evict: the running total had drifted
+            redis_client.set(_TOTAL_BYTES_KEY, 0)
+            break
+        victims = []
+        for cache_key, size in zip(candidates, redis_client.hmget(_SIZES_KEY, candidates)):
+            victims.append(cache_key)
+            excess -= int(size or 0)
+            if excess <= 0:
+                break
+        _evict(victims)
+
+
+def _evict(cache_keys: list):
+    """
+    Drop cache entries. Their result blobs are only released here: a Celery result may still point
+    at them, so purge_released_results deletes them later.
+    """
+    if not cache_keys:
+        return
+    result_keys = redis_client.hmget(_RESULTS_KEY, cache_keys)
+    sizes = redis_client.hmget(_SIZES_KEY, cache_keys)
+    pipe = redis_client.pipeline()
+    for cache_key in cache_keys:
+        pipe.zscore(_LRU_KEY, cache_key)
+    last_access = pipe.execute()
+
+    released = {
+        result_key: score or time.time()
+        for result_key, score in zip(result_keys, last_access) if result_key is not None
+    }
+    freed = sum(int(size or 0) for result_key, size in zip(result_keys, sizes) if result_key is not None)
+
+    pipe = redis_client.pipeline()
+    pipe.hdel(_RESULTS_KEY, *cache_keys)
+    pipe.hdel(_SIZES_KEY, *cache_keys)
+    pipe.zrem(_LRU_KEY, *cache_keys)
+    if freed:
+        pipe.decrby(_TOTAL_BYTES_KEY, freed)
+    if released:
+        pipe.zadd(_RELEASED_KEY, released)
+    pipe.execute()
+    logger.info(f"Evicted {len(cache_keys)} cached results")
+
+
+def purge_released_results():
+    """
+    Delete released result blobs last handed out longer ago than Celery keeps task results,
+    unless a cache entry still refers to them.
+    """
+    def call():
+        candidates = redis_client.zrangebyscore(_RELEASED_KEY, "-inf", time.time() - RESULT_BLOB_GRACE,
+                                                start=0, num=EVICT_BATCH)
+        if not candidates:
+            return [], []
+        referenced = set(redis_client.hvals(_RESULTS_KEY))
+        return candidates, [result_key for result_key in candidates if result_key not in referenced]
+
+    candidates, unreferenced = guarded_call("result_purge", call, default=([], []))
+    if not candidates:
+        return
+    for result_key in unreferenced:
+        try:
+            blob_store.delete(result_key)
+        except Exception as e:
+            logger.warning(f"Failed to delete released result {result_key}: {e}")
+    guarded_call("result_purge", lambda: redis_client.zrem(_RELEASED_KEY, *candidates))
+    logger.info(f"Purged {len(candidates)} released results")
+
+
+def sweep_blobs():
+    """
+    Delete blobs that no task or cache entry will read again: uploads, chunks and spooled files older
+    than BLOB_STALE_AFTER, and result blobs that the cache does not track (e.g. when storing the entry
+    failed) once Celery's result_expires has passed.
+    """
+    tracked = guarded_call("blob_sweep", lambda: (set(redis_client.hvals(_RESULTS_KEY)),
+                                                  set(redis_client.zrange(_RELEASED_KEY, 0, -1))))
+    # Without knowing which results are tracked nothing can be told stale
+    if tracked is None:
+        return
+    referenced, released = tracked
+
+    now = time.time()
+    stale = []
+    for key, modified_at in blob_store.iter_blobs():
+        age = now - modified_at
+        if key.startswith("results/"):
+            if age > RESULT_BLOB_GRACE and key not in referenced and key not in released:
+                stale.append(key)
+        elif age > BLOB_STALE_AFTER:
+            stale.append(key)
+
+    for key in stale:
+        try:
+            blob_store.delete(key)
+        except Exception as e:
+            logger.warning(f"Failed to delete stale blob {key}: {e}")
+    if stale:
+        logger.info(f"Swept {len(stale)} stale blobs")
+
+
+def claim_pending_task(cache_key: str, task_id: str) -> str:
+    """
+    Register task_id as the task computing cache_key unless another one is already pending.
+    Returns the id of the task that owns cache_key.
+    """
+    pending_key = f"{RESULT_CACHE_NAMESPACE}:pending:{cache_key}"
+
+    def call():
+        if redis_client.set(pending_key, task_id, nx=True, ex=PENDING_TASK_TTL):
+            return task_id
+        return redis_client.get(pending_key) or task_id
+
+    # Without the registry every request runs its own task
+    return guarded_call("pending_claim", call, default=task_id)
+
+
+def replace_pending_task(cache_key: str, task_id: str):
+    """
+    Take over cache_key from a pending task that failed.
+    """
+    guarded_call("pending_replace",
+                 lambda: redis_client.set(f"{RESULT_CACHE_NAMESPACE}:pending:{cache_key}", task_id,
+                                          ex=PENDING_TASK_TTL))
+
+
+def release_pending_task(cache_key: str, task_id: str):
+    """
+    Remove the pending entry of cache_key if task_id still owns it.
+    """
+    pending_key = f"{RESULT_CACHE_NAMESPACE}:pending:{cache_key}"
+    guarded_call("pending_release", lambda: _RELEASE_PENDING(keys=[pending_key], args=[task_id]))
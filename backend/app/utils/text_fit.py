@@ -0,0 +1,257 @@
+# app/utils/text_fit.py
+import numpy as np
+
+
+EPSILON = 1e-5  # same overflow tolerance as pymupdf's insert_textbox
+FIT_CANDIDATES = 8  # font sizes tried per box in each round of fit_fontsizes
+
+
+def measure_paragraphs(text: str, font) -> list[list[float]]:
+    """
+    Split text the way insert_textbox does (lines, then single spaces) and measure each word once
+    at font size 1. Widths scale linearly with the font size.
+    """
+    return [
+        [font.unit_length(word) for word in line.expandtabs(1).split(" ")]
+        for line in text.splitlines()
+    ]
+
+
+def _split_long_word(word_chars: list[float], max_width: float, line_width: float) -> tuple[int, float]:
+    """
+    Break an over-long word char by char like insert_textbox. Returns (lines closed, width of the open line).
+    """
+    closed = 0
+    for char_width in word_chars:
+        if line_width <= max_width - char_width:
+            line_width += char_width
+        else:
+            closed += 1
+            line_width = char_width
+    return closed, line_width
+
+
+def count_lines(paragraphs: list[list[float]], space_width: float, max_width: float,
+                long_words: dict = None) -> int:
+    """
+    Count the lines insert_textbox produces for pre-measured paragraphs in a line of max_width
+    (all widths in the same unit, e.g. font size 1 and rect width / fontsize).
+    """
+    lines = 0
+    for p_ix, widths in enumerate(paragraphs):
+        has_content = False
+        rest = max_width
+        for w_ix, width in enumerate(widths):
+            if rest >= width:
+                rest -= width + space_width
+                has_content = True
+                continue
+
+            if has_content:
+                lines += 1
+
+            if width <= max_width:
+                rest = max_width - width - space_width
+                has_content = True
+                continue
+
+            # Over-long word: split across lines char by char, then a space is appended
+            chars = (long_words or {}).get((p_ix, w_ix), [width])
+            closed, line_width = _split_long_word(chars, max_width, 0.0)
+            lines += closed
+            rest = max_width - line_width - space_width
+            has_content = True
+
+        # An empty paragraph still takes one line
+        lines += 1
+    return max(lines, 1)
+
+
+def textbox_height(line_count: int, fontsize: float, font) -> float:
+    """
+    Height insert_textbox needs for line_count lines: line height times lines plus one descender.
+    """
+    lheight_factor = font.ascender - font.descender
+    if lheight_factor <= 1:
+        lheight_factor = 1.2
+    return fontsize * (lheight_factor * line_count - font.descender)
+
+
+class WrapKeys:
+    """
+    Pre-measured paragraphs of many boxes, laid back to back as cumulative word-width keys so that
+    count_lines for any number of (box, line width) queries runs as one vectorized pass per output line.
+
+    Per paragraph, keys[k] = sum(widths[:k]) + space_width * k. A line that starts at word p with
+    `used` width already taken holds words p..j-1 iff keys[j] - keys[p] + used <= max_width, so each
+    line end is one searchsorted. A line starting on a word has used = -space_width; only over-long
+    words are split in Python, after which the line goes on from the word's tail (used = tail width).
+    """
+    def __init__(self, boxes_paragraphs: list[list[list[float]]], space_width: float,
+                 boxes_long_words: list[dict] = None):
+        self.space_width = space_width
+        self.boxes_long_words = boxes_long_words or [None] * len(boxes_paragraphs)
+
+        paragraphs = [words for box in boxes_paragraphs for words in box]
+        sizes = np.array([len(words) + 1 for words in paragraphs], dtype=np.int64)
+        # Each paragraph's first key repeats the previous paragraph's last one, so the whole array is sorted
+        first_keys = np.cumsum(sizes) - sizes
+        word_slots = np.ones(int(sizes.sum()), dtype=bool)
+        word_slots[first_keys] = False
+        # Width of the word starting at each key position, 0 at paragraph ends
+        widths = np.concatenate([np.asarray(words, dtype=np.float64) for words in paragraphs] or [np.zeros(0)])
+        self.widths = np.zeros(len(word_slots))
+        self.widths[np.flatnonzero(word_slots) - 1] = widths
+        key_steps = np.zeros(len(word_slots))
+        key_steps[word_slots] = widths + space_width
+        self.keys = np.cumsum(key_steps)
+        self.paragraph_starts = first_keys
+        self.paragraph_ends = first_keys + sizes - 1
+        # (box, paragraph, word) of each key position, to look up the chars of an over-long word
+        self.word_ids = [
+            (box_ix, p_ix, w_ix)
+            for box_ix, box in enumerate(boxes_paragraphs)
+            for p_ix, words in enumerate(box)
+            for w_ix in range(len(words) + 1)
+        ]
+
+        box_paragraphs = np.array([len(box) for box in boxes_paragraphs], dtype=np.int64)
+        self.box_paragraphs = box_paragraphs
+        self.box_first_paragraph = np.cumsum(box_paragraphs) - box_paragraphs
+
+    def line_counts(self, box_ixs, max_widths) -> np.ndarray:
+        """
+        count_lines of box box_ixs[i] in a line of max_widths[i], for every i.
+        """
+        box_ixs = np.asarray(box_ixs, dtype=np.int64)
+        max_widths = np.asarray(max_widths, dtype=np.float64)
+
+        # One row per (query, paragraph of its box)
+        paragraph_counts = self.box_paragraphs[box_ixs]
+        rows = np.repeat(np.arange(len(box_ixs)), paragraph_counts)
+        if not len(rows):
+            return np.ones(len(box_ixs), dtype=np.int64)
+        paragraph_ixs = (np.repeat(self.box_first_paragraph[box_ixs], paragraph_counts) + np.arange(len(rows))
+                         - np.repeat(np.cumsum(paragraph_counts) - paragraph_counts, paragraph_counts))
+        # An empty paragraph still takes one line
+        lines = np.ones(len(rows), dtype=np.int64)
+
+        # Rows still wrapping; finished ones are dropped so that each pass only touches open lines.
+        # Every pass closes one line per row: a row is at the start of a word that fits the line,
+        # or (used >= 0) on the tail of a split over-long word
+        positions = self.paragraph_starts[paragraph_ixs]
+        ends = self.paragraph_ends[paragraph_ixs]
+        live = np.flatnonzero(positions < ends)
+        lines[live] = 0
+        positions, ends, line_widths = positions[live], ends[live], max_widths[rows[live]]
+        used = np.full(len(live), -self.space_width)
+        open_rows = np.ones(len(live), dtype=bool)
+        while True:
+            # Over-long word: split across lines char by char, then the next word follows the tail
+            for row in np.flatnonzero(open_rows & (self.widths[positions] > line_widths)):
+                box_ix, p_ix, w_ix = self.word_ids[positions[row]]
+                chars = (self.boxes_long_words[box_ix] or {}).get((p_ix, w_ix), [self.widths[positions[row]]])
+                closed, used[row] = _split_long_word(chars, line_widths[row], 0.0)
+                lines[live[row]] += closed
+                positions[row] += 1
+                # The tail's line is still open when the word ends the paragraph
+                if positions[row] == ends[row]:
+                    lines[live[row]] += 1
+                    open_rows[row] = False
+
+            if not open_rows.all():
+                live, positions, ends, line_widths, used = (live[open_rows], positions[open_rows], ends[open_rows],
+                                                            line_widths[open_rows], used[open_rows])
+            if not len(live):
+                break
+
+            lines[live] += 1
+            line_ends = np.searchsorted(self.keys, self.keys[positions] + line_widths - used, side="right") - 1
+            # A line starting on a word holds it, even if rounding says otherwise
+            positions = np.minimum(np.maximum(line_ends, positions + (used < 0)), ends)
+            used.fill(-self.space_width)
+            open_rows = positions < ends
+
+        return np.maximum(np.bincount(rows, weights=lines, minlength=len(box_ixs)).astype(np.int64), 1)
+
+
+def fit_fontsizes(texts: list[str], rects: list, font, min_fontsize: float = 4, max_fontsizes=20,
+                  tolerance: float = 0.01) -> list[float]:
+    """
+    Largest font size (within tolerance) at which insert_textbox can place each text into its rect.
+    max_fontsizes is one size for all boxes or one per box.
+
+    Word widths are measured once. Each round wraps candidate sizes spread over every open interval,
+    its ends included in the first round, in one WrapKeys.line_counts call. The required height never
+    decreases with the font size, so the sizes that fit form a prefix and each interval shrinks to the
+    gap between its last fit and its first miss.
+    """
+    max_fontsizes = np.broadcast_to(np.asarray(max_fontsizes, dtype=np.float64), (len(texts),))
+    fontsizes = np.full(len(texts), float(min_fontsize))
+    space_width = font.unit_length(" ")
+    single_line = textbox_height(1, 1, font)
+
+    boxes, boxes_paragraphs, boxes_long_words, rect_widths, rect_heights, highs = [], [], [], [], [], []
+    for box_ix, (text, rect) in enumerate(zip(texts, rects)):
+        x0, y0, x1, y1 = rect
+        rect_width = abs(x1 - x0)
+        rect_height = abs(y1 - y0)
+        if not text or not text.strip() or rect_width <= 0 or rect_height <= 0:
+            continue
+        # Upper bound: the size at which even a single line would be too tall
+        high = min(max_fontsizes[box_ix], rect_height / single_line)
+        if high < min_fontsize:
+            continue
+
+        paragraphs = measure_paragraphs(text, font)
+        boxes.append(box_ix)
+        boxes_paragraphs.append(paragraphs)
+        # Chars are measured only for words that can be wider than the line
+        long_words = {}
+        for p_ix, line in enumerate(text.splitlines()):
+            if max(paragraphs[p_ix]) * high <= rect_width:
+                continue
+            for w_ix, word in enumerate(line.expandtabs(1).split(" ")):
+                if paragraphs[p_ix][w_ix] * high > rect_width:
+                    long_words[(p_ix, w_ix)] = [font.unit_length(ch) for ch in word]
+        boxes_long_words.append(long_words)
+        rect_widths.append(rect_width)
+        rect_heights.append(rect_height)
+        highs.append(high)
+    if not boxes:
+        return fontsizes.tolist()
+
+    wrap_keys = WrapKeys(boxes_paragraphs, space_width, boxes_long_words)
+    rect_widths, rect_heights = np.array(rect_widths), np.array(rect_heights)
+
+    def fits(box_ixs, candidates):
+        lines = wrap_keys.line_counts(box_ixs, rect_widths[box_ixs] / candidates)
+        return textbox_height(lines, candidates, font) - rect_heights[box_ixs] <= EPSILON
+
+    high = np.array(highs)
+    low = np.full(len(boxes), float(min_fontsize))
+    open_boxes = np.arange(len(boxes))
+    first_round = True
+    while len(open_boxes):
+        if first_round:
+            steps = np.linspace(0, 1, FIT_CANDIDATES)
+        else:
+            steps = np.arange(1, FIT_CANDIDATES + 1) / (FIT_CANDIDATES + 1)
+        candidates = low[open_boxes, None] + (high - low)[open_boxes, None] * steps
+        fit = fits(np.repeat(open_boxes, FIT_CANDIDATES), candidates.ravel()).reshape(candidates.shape)
+        # Index of the first candidate that misses, FIT_CANDIDATES when all fit
+        first_miss = np.where(fit.all(axis=1), FIT_CANDIDATES, np.argmin(fit, axis=1))
+        rows = np.arange(len(open_boxes))
+        has_fit = first_miss > 0
+        low[open_boxes[has_fit]] = candidates[rows[has_fit], first_miss[has_fit] - 1]
+        has_miss = first_miss < FIT_CANDIDATES
+        high[open_boxes[has_miss]] = candidates[rows[has_miss], first_miss[has_miss]]
+        if first_round:
+            # Done when even the upper bound fits, or when not even min_fontsize does (it is kept then)
+            open_boxes = open_boxes[has_fit & has_miss]
+            first_round = False
+        open_boxes = open_boxes[high[open_boxes] - low[open_boxes] > tolerance]
+
+    fontsizes[boxes] = low
+    return fontsizes.tolist()
+
@@ -0,0 +1,66 @@
+# app/utils/text_sanitizer.py
+import re
+import unicodedata
+
+
+# Stray combining diacritics and carets that often appear due to font issues
+STRAY_DIACRITICS = (
+    "\u02C6"    # ^
+    "\u005E"    # ^ (ASCII)
+    "\u0302"    # combining circumflex
+    "\u0309"    # combining hook above
+    "\u0306"    # combining breve
+    "\u0301"    # acute
+    "\u0300"    # grave
+    "\u0303"    # tilde
+    "\u0323"    # dot below
+)
+KEPT_CONTROLS = " \t\n\r"
+
+# Joins the spans of a box; it is a control character, so the table below never lets it through
+SPAN_SEPARATOR = "\x00"
+
+_MULTI_SPACE_RE = re.compile(r"\s{2,}")
+# Same as the legacy pattern with the separator excluded, so runs never cross span boundaries
+_REPEATED_SYMBOL_RE = re.compile(r"([^\x00a-zA-Z0-9\u00C0-\u1FFF\u2000-\u206F])\1{3,}")
+_SPAN_JOIN_RE = re.compile(r"\s*(?:\x00\s*)+")
+
+
+class _DeletionTable(dict):
+    """
+    str.translate table that deletes control/non-printable characters (except whitespace, tab,
+    newline) and stray diacritics. Decisions are made on first sight of a character and cached.
+    """
+    def __missing__(self, codepoint: int):
+        ch = chr(codepoint)
+        if ch in STRAY_DIACRITICS or (unicodedata.category(ch)[0] == "C" and ch not in KEPT_CONTROLS):
+            value = None
+        else:
+            value = codepoint
+        self[codepoint] = value
+        return value
+
+
+_DELETION_TABLE = _DeletionTable()
+
+
+def sanitize_spans(texts) -> str:
+    """
+    Clean a sequence of span texts and join the non-empty ones with single spaces.
+
+    Equivalent to cleaning every span on its own (drop control characters and stray diacritics,
+    collapse whitespace runs, NFC, drop runs of 4+ repeated symbols, strip) but done in one pass
+    over the joined text.
+    """
+    text = SPAN_SEPARATOR.join(text.translate(_DELETION_TABLE) for text in texts)
+    text = _MULTI_SPACE_RE.sub(" ", text)
+    text = unicodedata.normalize("NFC", text)
+    text = _REPEATED_SYMBOL_RE.sub("", text)
+    return _SPAN_JOIN_RE.sub(" ", text).strip()
+
+
+def sanitize_text(text: str) -> str:
+    """
+    Clean a single span of text.
+    """
+    return sanitize_spans((text,))
@@ -0,0 +1,110 @@
+# app/utils/translation_memory.py
+import os
+import re
+import hashlib
+import logging
+import unicodedata
+from collections import OrderedDict
+from threading import Lock
+from dotenv import load_dotenv
+from utils.redis_cache import cache_get_many, cache_set_many
+
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+TRANSLATION_MEMORY_TTL = int(os.getenv("TRANSLATION_MEMORY_TTL", 60 * 60 * 24 * 30))  # 30 days
+TRANSLATION_MEMORY_LOCAL_SIZE = int(os.getenv("TRANSLATION_MEMORY_LOCAL_SIZE", 20000))
+TRANSLATION_MEMORY_NAMESPACE = "translation_memory"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Local fallback used when Redis is unreachable (per worker process)
+_local_memory = OrderedDict()
+_local_lock = Lock()
+
+
+def normalize_segment(text: str) -> str:
+    """
+    Normalize a segment so trivially different extractions share one memory entry.
+    """
+    text = unicodedata.normalize("NFC", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def segment_key(text: str, source_lang_code: str, target_lang_code: str,
+                model: str, prompt_version: str) -> str:
+    """
+    Build the memory key for a segment: normalized-text hash plus language pair, model and prompt version.
+    """
+    digest = hashlib.sha256(normalize_segment(text).encode("utf-8")).hexdigest()
+    return f"{TRANSLATION_MEMORY_NAMESPACE}:{prompt_version}:{model}:{source_lang_code}:{target_lang_code}:{digest}"
+
+
+def _local_get(key: str):
+    with _local_lock:
+        value = _local_memory.get(key)
+        if value is not None:
+            _local_memory.move_to_end(key)
+        return value
+
+
+def _local_set(key: str, value: str):
+    with _local_lock:
+        _local_memory[key] = value
+        _local_memory.move_to_end(key)
+        while len(_local_memory) > TRANSLATION_MEMORY_LOCAL_SIZE:
+            _local_memory.popitem(last=False)
+
+
+def lookup_translations(texts: list[str], source_lang_code: str, target_lang_code: str,
+                        model: str, prompt_version: str) -> list:
+    """
+    Look up translations for texts. Returns a list aligned with texts, None for misses.
+    """
+    if not texts:
+        return []
+
+    keys = [segment_key(t, source_lang_code, target_lang_code, model, prompt_version) for t in texts]
+    results = [_local_get(key) for key in keys]
+
+    missing = [ix for ix, value in enumerate(results) if value is None]
+    if not missing:
+        return results
+
+    # One MGET for all misses; skipped (local memory only) while Redis is unhealthy
+    cached_values = cache_get_many([keys[ix] for ix in missing])
+    for ix, value in zip(missing, cached_values):
+        if value is not None:
+            results[ix] = value
+            _local_set(keys[ix], value)
+
+    return results
+
+
+def store_translations(texts: list[str], translations: list[str], source_lang_code: str,
+                       target_lang_code: str, model: str, prompt_version: str,
+                       ttl: int = TRANSLATION_MEMORY_TTL):
+    """
+    Store translated segments in Redis and in the local fallback memory.
+    """
+    if not texts:
+        return
+
+    entries = {}
+    for text, translation in zip(texts, translations):
+        if not translation:
+            continue
+        key = segment_key(text, source_lang_code, target_lang_code, model, prompt_version)
+        entries[key] = translation
+        _local_set(key, translation)
+
+    if not entries:
+        return
+
+    cache_set_many(entries, ttl)
@@ -1,11 +1,16 @@
 # utils/translator.py
 import os
+import re
 import json
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from deep_translator import GoogleTranslator
-from openai import OpenAI
+from openai import OpenAI, RateLimitError
 from dotenv import load_dotenv
 from configs.language_config import CODE_TO_NAME
+from utils.rate_limiter import RateLimiter
+from utils.batch_planner import estimate_tokens, plan_batches, stitch_translations
 
 
 logging.basicConfig(
@@ -20,10 +25,34 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 groq_client = OpenAI(
     api_key=GROQ_API_KEY, 
     base_url="https://api.groq.com/openai/v1",
+    max_retries=0,  # 429s are retried by batch_translate through the shared rate limiter
 )
 
-BATCH_SIZE = 8
-SLEEP_BETWEEN_REQUESTS = 8
+GROQ_MODEL = os.getenv("GROQ_MODEL", "qwen/qwen3-32b")
+# Bump whenever BATCH_PROMPT changes so the translation memory is not reused across prompts
+PROMPT_VERSION = "2"
+
+# Provider quota, shared through Redis by all translation threads of all workers
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", 30))
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", 30000))
+TRANSLATE_MAX_WORKERS = int(os.getenv("TRANSLATE_MAX_WORKERS", 4))
+MAX_RATE_LIMIT_RETRIES = 5
+# Longest Retry-After worth waiting for; longer ones (e.g. an exhausted daily quota) fall back to Google
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 60))
+
+# Missing or misaligned segments are re-sent to the LLM before falling back to Google
+MAX_SEGMENT_RETRIES = int(os.getenv("MAX_SEGMENT_RETRIES", 2))
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 8.0
+GOOGLE_FALLBACK_WORKERS = int(os.getenv("GOOGLE_FALLBACK_WORKERS", 8))
+
+rate_limiter = RateLimiter(
+    requests_per_minute=GROQ_REQUESTS_PER_MINUTE,
+    tokens_per_minute=GROQ_TOKENS_PER_MINUTE,
+    name="groq"
+)
+
+_KEYED_PAIR_RE = re.compile(r'"(\d+)"\s*:\s*"((?:[^"\\]|\\.)*)"')
 
 BATCH_PROMPT = """You are an expert technical translator and text reconstructor for academic PDFs. You translate content from {source_language} into {target_language} with strict structure and formatting rules. Your task is to process multiple input segments and output a SINGLE JSON object.
 
@@ -33,10 +62,10 @@ CRITICAL RULES - FOLLOW EXACTLY:
     - Output ONLY a valid JSON object.
     - The JSON MUST HAVE EXACTLY:
         {{
-          "translations": ["...", "...", ...]
+          "translations": {{"0": "...", "1": "...", ...}}
         }}
-    - The array MUST contain exactly {count} translated strings.
-    - Keep the order exactly identical to the input.
+    - The object MUST contain exactly {count} translated strings, keyed by the segment id ("0" to "{last_id}").
+    - Each translation MUST use the id of its input segment. Never merge or split segments.
     - NO explanations, NO comments, NO markdown, NO code blocks, NO introductory text.
 
 2. TEXT RECONSTRUCTION (Mandatory BEFORE translation)
@@ -78,7 +107,7 @@ CRITICAL RULES - FOLLOW EXACTLY:
 
 INPUT FORMAT
 
-The input consists of multiple text segments, separated by ===SEGMENT===:
+The input consists of multiple text segments, each preceded by a ===SEGMENT <id>=== marker:
 
 {texts}
 
@@ -87,70 +116,228 @@ OUTPUT FORMAT (MANDATORY)
 Output ONLY this JSON object and nothing else:
 
 {{
-  "translations": ["translated text 1", "translated text 2", ...]
+  "translations": {{"0": "translated text 0", "1": "translated text 1", ...}}
 }}
-Ensure the array has exactly {count} items in the same order.
+Ensure the object has exactly {count} items, one per segment id.
 """
 
-def batch_translate(texts: list[str], source_lang_code: str, target_lang_code: str) -> list[str]:
-    if not texts:
-        return []
+class RateLimitWaitTooLong(Exception):
+    pass
+
+
+def retry_after_seconds(error: RateLimitError, attempt: int) -> float:
+    """
+    Read the Retry-After header of a 429 response, falling back to exponential backoff.
+    """
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return min(2 ** attempt, 60)
+
+
+def request_completion(prompt: str, request_tokens: int) -> str:
+    """
+    Send one completion request through the shared rate limiter, retrying 429 responses.
+    A Retry-After above RATE_LIMIT_MAX_WAIT raises RateLimitWaitTooLong without pausing the shared
+    limiter, which would otherwise stall every worker for that long.
+    """
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        rate_limiter.acquire(request_tokens)
+        try:
+            response = groq_client.chat.completions.create(
+                model=GROQ_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=8192,
+                reasoning_effort="none",
+                response_format={"type": "json_object"},
+                stream=False
+            )
+            return (response.choices[0].message.content or "").strip()
+        except RateLimitError as e:
+            if attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            wait = retry_after_seconds(e, attempt)
+            if wait > RATE_LIMIT_MAX_WAIT:
+                raise RateLimitWaitTooLong(
+                    f"Rate limited (429) for {wait:.0f}s, over RATE_LIMIT_MAX_WAIT={RATE_LIMIT_MAX_WAIT:.0f}s"
+                ) from e
+            logger.warning(f"[GROQ] Rate limited (429), retrying in {wait:.1f}s")
+            rate_limiter.pause(wait)
+
+
+def parse_translations(content: str, count: int) -> dict[int, str]:
+    """
+    Extract keyed translations from a model reply, salvaging what it can from malformed or truncated JSON.
+    """
+    translations = None
+    try:
+        translations = json.loads(content).get("translations")
+    except (json.JSONDecodeError, AttributeError):
+        # Strips leading/trailing chatter around the JSON object
+        start = content.find('{')
+        end = content.rfind('}')
+        if start != -1 and end != -1 and start < end:
+            try:
+                translations = json.loads(content[start:end+1]).get("translations")
+            except (json.JSONDecodeError, AttributeError):
+                pass
+
+    parsed = {}
+    if isinstance(translations, dict):
+        for key, value in translations.items():
+            if str(key).isdigit() and int(key) < count and isinstance(value, str) and value.strip():
+                parsed[int(key)] = value
+    elif isinstance(translations, list):
+        # An unkeyed list can only be trusted when it is complete
+        if len(translations) == count and all(isinstance(v, str) for v in translations):
+            parsed = {ix: value for ix, value in enumerate(translations) if value.strip()}
+    else:
+        # Truncated or broken JSON: keep every complete "id": "text" pair
+        for match in _KEYED_PAIR_RE.finditer(content):
+            key = int(match.group(1))
+            try:
+                value = json.loads(f'"{match.group(2)}"')
+            except json.JSONDecodeError:
+                continue
+            if key < count and value.strip():
+                parsed[key] = value
+
+    return parsed
+
+
+def google_translate_many(texts: list[str], source_lang_code: str, target_lang_code: str) -> list[str]:
+    """
+    Translate texts with Google in parallel, keeping the source text when a call fails.
+    """
+    def run(text):
+        try:
+            return GoogleTranslator(source=source_lang_code, target=target_lang_code).translate(text) or text
+        except Exception as e:
+            logger.warning(f"[GOOGLE] {e}. Keeping source text")
+            return text
+
+    with ThreadPoolExecutor(max_workers=max(1, min(GOOGLE_FALLBACK_WORKERS, len(texts)))) as executor:
+        return list(executor.map(run, texts))
 
-    count = len(texts)
-    separator = "\n===SEGMENT===\n"
-    combined = separator.join(texts)
+
+def batch_translate(texts: list[str], source_lang_code: str, target_lang_code: str) -> tuple[list[str], list[bool]]:
+    """
+    Translate a batch with the LLM. Segments missing from a reply are re-sent on their own
+    with exponential backoff; only what is still missing afterwards goes to Google.
+    Returns the translations and, for each segment, whether the LLM translated it.
+    """
+    if not texts:
+        return [], []
 
     source_language = CODE_TO_NAME[source_lang_code]
     target_language = CODE_TO_NAME[target_lang_code]
 
-    final_prompt = BATCH_PROMPT.format(
-        count=count,
-        texts=combined,
-        source_language=source_language,
-        target_language=target_language  
-    )
+    results = [None] * len(texts)
+    pending = list(range(len(texts)))
 
-    try:
-        response = groq_client.chat.completions.create(
-            model="qwen/qwen3-32b",
-            messages=[{"role": "user", "content": final_prompt}],
-            temperature=0.3,
-            max_tokens=8192,
-            reasoning_effort="none",
-            response_format={"type": "json_object"},
-            stream=False
+    for attempt in range(MAX_SEGMENT_RETRIES + 1):
+        if attempt:
+            backoff = min(RETRY_BACKOFF_BASE * 2 ** (attempt - 1), RETRY_BACKOFF_MAX)
+            logger.warning(f"[GROQ] Retrying {len(pending)}/{len(texts)} segments in {backoff:.1f}s")
+            time.sleep(backoff)
+
+        count = len(pending)
+        combined = "\n".join(f"===SEGMENT {ix}===\n{texts[orig_ix]}" for ix, orig_ix in enumerate(pending))
+        final_prompt = BATCH_PROMPT.format(
+            count=count,
+            last_id=count - 1,
+            texts=combined,
+            source_language=source_language,
+            target_language=target_language
         )
 
-        content = response.choices[0].message.content.strip()
+        # Input prompt plus roughly as many output tokens as input text
+        request_tokens = estimate_tokens(final_prompt) + estimate_tokens(combined)
 
-        # Parse JSON to get translated batch
-        try:
-            data = json.loads(content)
-            translations = data.get("translations", [])
-            if len(translations) == count:
-                return translations
-        except:
-            pass
-
-        # Fallback parse
         try:
-            start = content.find('{')
-            end = content.rfind('}')
-
-            if start != -1 and end != -1 and start < end:
-                json_string = content[start:end+1]
-                data = json.loads(s=json_string)
-                translations = data.get("translations", [])
-                
-                if len(translations) == count:
-                    return translations
-
-            logger.warning(f"[GROQ] Failed to parse clean JSON. Raw content: {content[:100]}...\t. Fallback Google")
-            return [GoogleTranslator(source=source_lang_code, target=target_lang_code).translate(t) for t in texts]
+            content = request_completion(final_prompt, request_tokens)
+        except RateLimitWaitTooLong as e:
+            # Retrying within the wait would only hit the limit again
+            logger.warning(f"[GROQ] {e}")
+            break
         except Exception as e:
-            logger.warning(f"[GROQ] JSON loading failed: {e}. Raw content: {content[:100]}...")
-            pass
+            logger.warning(f"[GROQ] {e}")
+            continue
+
+        translations = parse_translations(content, count)
+        for ix, translation in translations.items():
+            results[pending[ix]] = translation
+        pending = [orig_ix for orig_ix in pending if results[orig_ix] is None]
+        if not pending:
+            return results, [True] * len(texts)
+
+        logger.warning(f"[GROQ] Reply covered {len(translations)}/{count} segments. Raw content: {content[:100]}...")
+
+    logger.warning(f"[GROQ] {len(pending)} segments still untranslated. Fallback Google")
+    fallback = google_translate_many([texts[ix] for ix in pending], source_lang_code, target_lang_code)
+    for orig_ix, translation in zip(pending, fallback):
+        results[orig_ix] = translation
+
+    from_llm = [True] * len(texts)
+    for orig_ix in pending:
+        from_llm[orig_ix] = False
+    return results, from_llm
+
+
+def translate_batches(batches: list[list[str]], source_lang_code: str, target_lang_code: str,
+                      max_workers: int = TRANSLATE_MAX_WORKERS, progress=None) -> list[tuple[list[str], list[bool]]]:
+    """
+    Translate batches concurrently; pacing comes from the shared rate limiter. Output keeps input order
+    and holds the (translations, from_llm) pair of batch_translate for each batch.
+    progress, if given, is told how many batches are planned and when each one completes.
+    """
+    if not batches:
+        return []
+    if progress is not None:
+        progress.batches_planned(len(batches))
+
+    def run(batch_ix_texts):
+        batch_ix, batch_texts = batch_ix_texts
+        logger.info(f"\t.:Translating batch {batch_ix + 1}/{len(batches)} ({len(batch_texts)} box)...")
+        translated = batch_translate(
+            batch_texts,
+            source_lang_code=source_lang_code,
+            target_lang_code=target_lang_code
+        )
+        if progress is not None:
+            progress.batch_completed()
+        return translated
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        return list(executor.map(run, enumerate(batches)))
+
+
+def translate_texts(texts: list[str], source_lang_code: str, target_lang_code: str,
+                    progress=None) -> tuple[list[str], list[bool]]:
+    """
+    Plan token-aware batches for texts, translate them concurrently and stitch split segments back.
+    Returns the translations and, for each text, whether the LLM translated all of its pieces.
+    """
+    if not texts:
+        return [], []
+
+    batches, pieces_per_text = plan_batches(texts)
+    logger.info(f".:Translating {len(texts)} segments in {len(batches)} batch")
+
+    batches_translated = translate_batches(
+        batches,
+        source_lang_code=source_lang_code,
+        target_lang_code=target_lang_code,
+        progress=progress
+    )
+    translations = stitch_translations([batch for batch, _ in batches_translated], pieces_per_text)
 
-    except Exception as e:
-        logger.warning(f"[GROQ] {e}\t. Fallback Google")
-        return [GoogleTranslator(source=source_lang_code, target=target_lang_code).translate(t) for t in texts]
+    # A text counts as LLM-translated only if none of its pieces fell back to Google
+    flat_from_llm = [flag for _, batch_from_llm in batches_translated for flag in batch_from_llm]
+    from_llm = []
+    offset = 0
+    for count in pieces_per_text:
+        from_llm.append(all(flat_from_llm[offset:offset + count]))
+        offset += count
+    return translations, from_llm
@@ -0,0 +1,60 @@
+# benchmarks/bench_layout_cache.py
+"""
+Compare the layout cache formats: the former full to_json output stored as JSON text against
+the pruned, per-page compressed encoding of utils.layout_codec.
+
+Reports the stored size, the time to decode the whole document on a cache hit, and the time
+to decode a single page.
+
+Usage (from backend/app):
+    python ../benchmarks/bench_layout_cache.py path/to/file.pdf [...]
+"""
+import os
+import sys
+import json
+import timeit
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+REPEAT = 5
+
+
+def best_ms(fn) -> float:
+    return min(timeit.repeat(fn, number=1, repeat=REPEAT)) * 1000
+
+
+def main():
+    import pymupdf
+    import pymupdf.layout
+    import pymupdf4llm
+    from utils import layout_codec
+    from utils.layout_codec import encode_layout, decode_layout
+
+    print(f"serializer: {'msgpack' if layout_codec.msgpack else 'json'}, "
+          f"compressor: {'zstd' if layout_codec.zstandard else 'zlib'}")
+    print(f"{'file':<28} {'pages':>5} {'json KB':>8} {'new KB':>7} {'json ms':>8} {'new ms':>7} {'1 page ms':>9}")
+    for path in sys.argv[1:]:
+        with pymupdf.open(path) as doc:
+            raw = json.loads(pymupdf4llm.to_json(doc, image_dpi=300, image_format="png", image_path=""))
+
+        legacy_blob = json.dumps(raw, ensure_ascii=False).encode("utf-8")
+        blob = encode_layout(raw)
+
+        # A cache hit that walks every box of every page, as the pipeline does
+        def decode_all():
+            data = decode_layout(blob)
+            return sum(len(page["boxes"]) for page in data["pages"])
+
+        assert decode_all() == sum(len(page["boxes"]) for page in raw["pages"])
+        legacy_ms = best_ms(lambda: json.loads(legacy_blob))
+        new_ms = best_ms(decode_all)
+        page_ms = best_ms(lambda: decode_layout(blob)["pages"][0])
+        print(f"{Path(path).name[:28]:<28} {len(raw['pages']):>5} {len(legacy_blob) / 1024:>8.1f} "
+              f"{len(blob) / 1024:>7.1f} {legacy_ms:>8.2f} {new_ms:>7.2f} {page_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
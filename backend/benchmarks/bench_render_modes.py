@@ -0,0 +1,136 @@
+# benchmarks/bench_render_modes.py
+"""
+Compare wall time and peak RSS of the "single" and "two_pass" render modes.
+
+Layout detection and translation are taken out of the measurement: layout is computed once
+up front and translation is replaced by the identity, so only figure/text rendering is timed.
+Each (file, mode) pair runs in a fresh process so peak RSS is not shared between runs;
+"RSS growth" is the sampled peak above the RSS measured right before the run.
+
+Usage (from backend/app):
+    python ../benchmarks/bench_render_modes.py path/to/corpus_dir_or_file.pdf ...
+"""
+import os
+import sys
+import json
+import time
+import resource
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+MODES = ["two_pass", "single"]
+
+
+def current_rss() -> int:
+    """
+    Resident set size of this process in bytes (Linux).
+    """
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class RssSampler(threading.Thread):
+    """
+    Sample the RSS every few milliseconds and keep the peak.
+    """
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, current_rss())
+            time.sleep(self.interval)
+
+    def stop(self) -> int:
+        self.stopped.set()
+        self.join()
+        return self.peak
+
+
+def run_worker(pdf_path: str, layout_path: str, mode: str):
+    import services.pdf_service as pdf_service
+    from configs.font_config import FONT_PRESETS
+
+    os.chdir(APP_DIR)
+    with open(layout_path, encoding="utf-8") as f:
+        layout_pages = json.load(f)["pages"]
+
+    def cached_layout(pdf_bytes, first_page=0, last_page=None, doc_id=None):
+        return {"pages": json.loads(json.dumps(layout_pages[first_page:last_page]))}
+
+    # Rendering only: no Redis, no layout model, no LLM
+    pdf_service.get_layout_data = cached_layout
+    pdf_service.lookup_translations = lambda texts, **kwargs: [None] * len(texts)
+    pdf_service.store_translations = lambda *args, **kwargs: None
+    pdf_service.translate_texts = lambda texts, **kwargs: (list(texts), [False] * len(texts))
+
+    pdf_bytes = Path(pdf_path).read_bytes()
+    baseline_rss = current_rss()
+    sampler = RssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    result = pdf_service.process_pdf_bytes(
+        pdf_bytes=pdf_bytes,
+        font_metadata=FONT_PRESETS["Noto Sans"],
+        render_mode=mode
+    )
+    elapsed = time.perf_counter() - start
+    peak_rss = sampler.stop()
+
+    print(json.dumps({
+        "seconds": elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rss_growth_mb": (peak_rss - baseline_rss) / 2 ** 20,
+        "output_kb": len(result) / 1024
+    }))
+
+
+def collect_pdfs(paths: list[str]) -> list[Path]:
+    pdfs = []
+    for path in map(Path, paths):
+        pdfs.extend(sorted(path.glob("*.pdf")) if path.is_dir() else [path])
+    return pdfs
+
+
+def main(paths: list[str]):
+    import services.pdf_service as pdf_service
+
+    print(f"{'file':<40} {'mode':<10} {'pages':>6} {'seconds':>9} {'peak RSS MB':>12} {'RSS growth MB':>14} {'output KB':>10}")
+    for pdf_path in collect_pdfs(paths):
+        pdf_bytes = pdf_path.read_bytes()
+        layout = pdf_service.get_layout_data.__wrapped__(pdf_bytes)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+            json.dump(layout, f)
+            layout_path = f.name
+
+        try:
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--worker", str(pdf_path), layout_path, mode],
+                    check=True, capture_output=True, text=True
+                ).stdout.strip().splitlines()[-1]
+                stats = json.loads(output)
+                print(f"{pdf_path.name[:40]:<40} {mode:<10} {len(layout['pages']):>6} "
+                      f"{stats['seconds']:>9.2f} {stats['peak_rss_mb']:>12.1f} {stats['rss_growth_mb']:>14.1f} "
+                      f"{stats['output_kb']:>10.0f}")
+        finally:
+            os.unlink(layout_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        run_worker(*sys.argv[2:5])
+    elif len(sys.argv) > 1:
+        main(sys.argv[1:])
+    else:
+        print(__doc__)
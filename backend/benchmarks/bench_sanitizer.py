@@ -0,0 +1,50 @@
+# benchmarks/bench_sanitizer.py
+"""
+Micro-benchmark for the box text sanitizer.
+
+Times sanitize_spans against the original per-span cleaning of consolidate_box_text on boxes
+from the given PDFs plus randomly generated hostile spans. The golden-output check for the same
+inputs lives in tests/test_text_sanitizer.py.
+
+Usage (from backend/app):
+    python ../benchmarks/bench_sanitizer.py [path/to/file.pdf ...]
+"""
+import os
+import sys
+import timeit
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "app"))
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+FUZZ_BOXES = 5000
+REPEAT = 5
+
+
+def pdf_boxes(paths: list[str]) -> list[list[list[str]]]:
+    import pymupdf
+    boxes = []
+    for path in paths:
+        with pymupdf.open(path) as doc:
+            for page in doc:
+                for block in page.get_text("dict")["blocks"]:
+                    boxes.append([[span["text"] for span in line["spans"]] for line in block.get("lines", [])])
+    return boxes
+
+
+def main():
+    from tests.test_text_sanitizer import legacy_consolidate, current_consolidate, fuzz_boxes
+
+    for name, boxes in (("pdf", pdf_boxes(sys.argv[1:])), ("fuzz", fuzz_boxes(FUZZ_BOXES))):
+        if not boxes:
+            continue
+        legacy_s = min(timeit.repeat(lambda: [legacy_consolidate(b) for b in boxes], number=1, repeat=REPEAT))
+        current_s = min(timeit.repeat(lambda: [current_consolidate(b) for b in boxes], number=1, repeat=REPEAT))
+        print(f"{name:>5}: {len(boxes)} boxes | legacy {legacy_s * 1000:.1f} ms, "
+              f"sanitizer {current_s * 1000:.1f} ms ({legacy_s / current_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/bench_wrap_height.py
+"""
+Micro-benchmark for the batched wrap used to fit font sizes, on typical paragraph lengths.
+Times are per box:
+
+- wrap: line counts of every box at FONTSIZES candidate sizes, with simulate_text_height and
+  count_lines (pure Python, one box and size per call) against WrapKeys.line_counts (NumPy, all
+  boxes and sizes in one call). Also checks that line_counts matches count_lines exactly.
+- fit: fitting every box, with the previous per-box bisection over count_lines against fit_fontsizes.
+
+Usage (from backend/app):
+    python ../benchmarks/bench_wrap_height.py
+"""
+import os
+import sys
+import random
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+WORDS = ("mô hình Transformer sử dụng cơ chế attention để xử lý chuỗi đầu vào song song "
+         "và đạt kết quả tốt trên nhiều tác vụ dịch máy representation learning").split()
+PARAGRAPH_LENGTHS = [10, 40, 120, 300]
+BOXES = 200
+SIMULATE_BOXES = 5  # simulate_text_height is slow, so it only runs on the first boxes
+FONTSIZES = np.linspace(4, 28, 32)
+REPEAT = 5
+
+
+def bisect_fontsize(text, rect, font, min_fontsize=4, max_fontsize=28, tolerance=0.005):
+    """
+    The previous fit_fontsize: a bisection over count_lines, one box at a time.
+    """
+    from utils.text_fit import EPSILON, count_lines, measure_paragraphs, textbox_height
+
+    x0, y0, x1, y1 = rect
+    rect_width, rect_height = abs(x1 - x0), abs(y1 - y0)
+    paragraphs = measure_paragraphs(text, font)
+    space_width = font.unit_length(" ")
+    long_words = {
+        (p_ix, w_ix): [font.unit_length(ch) for ch in word]
+        for p_ix, line in enumerate(text.splitlines())
+        for w_ix, word in enumerate(line.expandtabs(1).split(" "))
+        if paragraphs[p_ix][w_ix] * max_fontsize > rect_width
+    }
+
+    def fits(fontsize):
+        lines = count_lines(paragraphs, space_width, rect_width / fontsize, long_words)
+        return textbox_height(lines, fontsize, font) - rect_height <= EPSILON
+
+    high = min(max_fontsize, rect_height / textbox_height(1, 1, font))
+    if high >= min_fontsize and fits(high):
+        return high
+    low = min_fontsize
+    if not fits(low):
+        return min_fontsize
+    while high - low > tolerance:
+        mid = (low + high) / 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid
+    return low
+
+
+def main():
+    os.chdir(APP_DIR)
+    import pymupdf
+    from services.pdf_service import simulate_text_height
+    from utils.font_registry import get_font
+    from utils.text_fit import WrapKeys, count_lines, fit_fontsizes, measure_paragraphs
+
+    font_name, font_file_path = "NotoSans-Regular", "fonts/NotoSans-Regular.ttf"
+    mupdf_font = pymupdf.Font(fontname=font_name, fontfile=font_file_path)
+    metrics = get_font(font_name, font_file_path)
+    space_width = metrics.unit_length(" ")
+
+    random.seed(0)
+    print(f"{'words':>6} {'boxes':>6} | wrap x{len(FONTSIZES)} sizes: {'simulate':>9} {'count_lines':>12} "
+          f"{'batched':>8} {'exact':>6} | fit: {'bisect':>8} {'batched':>8} {'max diff':>9}")
+    for length in PARAGRAPH_LENGTHS:
+        texts, rects = [], []
+        for _ in range(BOXES):
+            texts.append(" ".join(random.choice(WORDS) for _ in range(random.randint(length // 2, length))))
+            x0, y0 = random.uniform(40, 200), random.uniform(40, 400)
+            rects.append((x0, y0, x0 + random.uniform(150, 450), y0 + random.uniform(20, 300)))
+        boxes_paragraphs = [measure_paragraphs(text, metrics) for text in texts]
+        box_ixs = np.repeat(np.arange(BOXES), len(FONTSIZES))
+        max_widths = np.array([(rect[2] - rect[0]) / size for rect in rects for size in FONTSIZES])
+
+        def simulate():
+            return [simulate_text_height(text, rect, mupdf_font, size)
+                    for text, rect in zip(texts[:SIMULATE_BOXES], rects) for size in FONTSIZES]
+
+        def scalar():
+            return [count_lines(boxes_paragraphs[box_ix], space_width, width)
+                    for box_ix, width in zip(box_ixs, max_widths)]
+
+        def batched():
+            return WrapKeys(boxes_paragraphs, space_width).line_counts(box_ixs, max_widths)
+
+        def bisect_all():
+            return [bisect_fontsize(text, rect, metrics) for text, rect in zip(texts, rects)]
+
+        def fit_all():
+            return fit_fontsizes(texts, rects, metrics, min_fontsize=4, max_fontsizes=28, tolerance=0.005)
+
+        exact = batched().tolist() == scalar()
+        max_diff = max(abs(a - b) for a, b in zip(bisect_all(), fit_all()))
+        timings = [min(timeit.repeat(fn, number=1, repeat=REPEAT)) * 1e6 / boxes
+                   for fn, boxes in ((simulate, SIMULATE_BOXES), (scalar, BOXES), (batched, BOXES),
+                                     (bisect_all, BOXES), (fit_all, BOXES))]
+        print(f"{length:>6} {BOXES:>6} | {'us/box':>16} {timings[0]:>9.0f} {timings[1]:>12.0f} {timings[2]:>8.0f} "
+              f"{str(exact):>6} | {'us/box':>3} {timings[3]:>8.0f} {timings[4]:>8.0f} {max_diff:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# tests/test_text_fit.py
+"""
+Exactness tests for the batched wrap: WrapKeys.line_counts must count exactly the lines count_lines
+does for every box and line width, and fit_fontsizes must return sizes at which insert_textbox places
+each text.
+"""
+import random
+from pathlib import Path
+
+import numpy as np
+import pymupdf
+import pytest
+
+from utils.font_registry import FontMetrics
+from utils.text_fit import WrapKeys, count_lines, fit_fontsizes, measure_paragraphs
+
+FONT_FILE = Path(__file__).resolve().parent.parent / "app" / "fonts" / "NotoSans-Regular.ttf"
+WORDS = ("mô hình Transformer sử dụng cơ chế attention để xử lý chuỗi đầu vào song song "
+         "và đạt kết quả tốt trên nhiều tác vụ dịch máy representation-learning").split()
+LONG_WORDS = ["https://arxiv.org/abs/1706.03762", "supercalifragilisticexpialidocious" * 2]
+
+
+@pytest.fixture(scope="module")
+def font():
+    return FontMetrics("NotoSans-Regular", str(FONT_FILE))
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    """
+    Paragraphs of common words with the occasional over-long word, double space and empty line.
+    """
+    parts = []
+    for _ in range(words):
+        roll = rng.random()
+        if roll < 0.03:
+            parts.append(rng.choice(LONG_WORDS))
+        elif roll < 0.06:
+            parts.append("\n")
+        elif roll < 0.08:
+            parts.append("")
+        else:
+            parts.append(rng.choice(WORDS))
+    return " ".join(parts).replace(" \n ", "\n")
+
+
+def long_word_chars(text: str, font) -> dict:
+    return {
+        (p_ix, w_ix): [font.unit_length(ch) for ch in word]
+        for p_ix, line in enumerate(text.splitlines())
+        for w_ix, word in enumerate(line.expandtabs(1).split(" "))
+        if len(word) > 20
+    }
+
+
+def test_line_counts_matches_count_lines(font):
+    rng = random.Random(0)
+    space_width = font.unit_length(" ")
+    texts = [random_text(rng, rng.randint(1, 120)) for _ in range(200)]
+    boxes_paragraphs = [measure_paragraphs(text, font) for text in texts]
+    boxes_long_words = [long_word_chars(text, font) for text in texts]
+    wrap_keys = WrapKeys(boxes_paragraphs, space_width, boxes_long_words)
+
+    box_ixs = np.repeat(np.arange(len(texts)), 100)
+    max_widths = np.tile(np.linspace(2, 60, 100), len(texts))
+    expected = [
+        count_lines(boxes_paragraphs[box_ix], space_width, width, boxes_long_words[box_ix])
+        for box_ix, width in zip(box_ixs, max_widths)
+    ]
+    assert wrap_keys.line_counts(box_ixs, max_widths).tolist() == expected
+
+
+def test_line_counts_on_exact_boundaries():
+    # Integer widths, so lines are filled exactly to the last unit
+    boxes_paragraphs = [[[1.0, 2.0, 3.0], [4.0]], [[0.0, 0.0]], [[5.0], [], [1.0, 1.0, 1.0, 1.0]]]
+    wrap_keys = WrapKeys(boxes_paragraphs, 1.0)
+    max_widths = np.arange(0.5, 12.5, 0.5)
+    for box_ix, paragraphs in enumerate(boxes_paragraphs):
+        expected = [count_lines(paragraphs, 1.0, width) for width in max_widths]
+        assert wrap_keys.line_counts(np.full(len(max_widths), box_ix), max_widths).tolist() == expected
+
+
+def test_fit_fontsizes_fit_insert_textbox(font):
+    rng = random.Random(1)
+    texts, rects = [], []
+    for _ in range(100):
+        texts.append(random_text(rng, rng.randint(1, 80)))
+        x0, y0 = rng.uniform(20, 200), rng.uniform(20, 400)
+        rects.append(pymupdf.Rect(x0, y0, x0 + rng.uniform(20, 350), y0 + rng.uniform(10, 300)))
+    fontsizes = fit_fontsizes(texts, rects, font, min_fontsize=4, max_fontsizes=20)
+
+    doc = pymupdf.open()
+    page = doc.new_page()
+    page.insert_font(fontname="F0", fontfile=str(FONT_FILE))
+    for text, rect, fontsize in zip(texts, rects, fontsizes):
+        if fontsize <= 4:
+            continue
+        assert page.insert_textbox(rect, text, fontname="F0", fontsize=fontsize, render_mode=3) >= 0
+        if fontsize < 20 - 0.02:
+            assert page.insert_textbox(rect, text, fontname="F0", fontsize=fontsize + 0.02, render_mode=3) < 0
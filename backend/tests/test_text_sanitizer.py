@@ -0,0 +1,117 @@
+# tests/test_text_sanitizer.py
+"""
+Golden-output tests for the box text sanitizer: sanitize_spans must clean box text exactly like
+the original per-span loop of consolidate_box_text.
+"""
+import re
+import random
+import unicodedata
+
+import pymupdf
+import pytest
+
+from utils.text_sanitizer import sanitize_spans, sanitize_text
+
+FUZZ_BOXES = 5000
+
+
+def legacy_consolidate(spans: list[list[str]]) -> str:
+    """
+    The original cleaning loop of consolidate_box_text, kept verbatim as the golden reference.
+    """
+    consolidated_lines = []
+    for line in spans:
+        line_text_parts = []
+        for raw_text in line:
+            text = ''.join(ch for ch in raw_text if unicodedata.category(ch)[0] != 'C' or ch in ' \t\n\r')
+            text = text.replace('\u02C6', '')
+            text = text.replace('^', '')
+            text = text.replace('\u0302', '')
+            text = text.replace('\u0309', '')
+            text = text.replace('\u0306', '')
+            text = text.replace('\u0301', '')
+            text = text.replace('\u0300', '')
+            text = text.replace('\u0303', '')
+            text = text.replace('\u0309', '')
+            text = text.replace('\u0323', '')
+            text = re.sub(r'\s{2,}', ' ', text)
+            text = unicodedata.normalize('NFC', text)
+            text = re.sub(r'([^a-zA-Z0-9\u00C0-\u1FFF\u2000-\u206F])\1{3,}', '', text)
+            cleaned = text.strip()
+            if cleaned:
+                line_text_parts.append(cleaned)
+        if line_text_parts:
+            consolidated_lines.append(" ".join(line_text_parts))
+    return " ".join(consolidated_lines).strip()
+
+
+def current_consolidate(spans: list[list[str]]) -> str:
+    return sanitize_spans([text for line in spans for text in line])
+
+
+def fuzz_boxes(count: int, seed: int = 0) -> list[list[list[str]]]:
+    """
+    Boxes of random hostile spans: control characters, stray diacritics, whitespace runs,
+    repeated symbols and decomposed Vietnamese.
+    """
+    alphabet = (
+        list("abcxyzABC019 .,;:-_*=#^~") + ["  ", "\t", "\n", "\r", "\x00", "\x07", "\x1f", "\x85",
+        "\u00A0", "\u2002", "\u2003", "\u200B", "\u200E", "\uFEFF", "\u3000"]
+        + ["\u02C6", "\u0302", "\u0309", "\u0306", "\u0301", "\u0300", "\u0303", "\u0323", "\u0308", "\u031B"]
+        + list("\u1EBF\u1EC7\u1EEF\u0111\u00E0\u00C0\u2026\u2022\u00B7\u2014") + [unicodedata.normalize("NFD", "Vi\u1EC7t Nam"), "\uD7A3", "\u1100\u1161", "\u1161"]
+        + ["----", "....", "****", "\u2022\u2022\u2022\u2022", "____", "\u2026\u2026\u2026\u2026"]
+    )
+    rng = random.Random(seed)
+    return [
+        [
+            ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))) for _ in range(rng.randint(0, 4))]
+            for _ in range(rng.randint(0, 4))
+        ]
+        for _ in range(count)
+    ]
+
+
+def _assert_matches_legacy(boxes: list[list[list[str]]]):
+    mismatches = [
+        (box, legacy_consolidate(box), current_consolidate(box))
+        for box in boxes if legacy_consolidate(box) != current_consolidate(box)
+    ]
+    assert not mismatches, f"{len(mismatches)} of {len(boxes)} boxes differ, e.g. {mismatches[:3]!r}"
+
+
+@pytest.mark.parametrize("spans", [
+    [],
+    [[""]],
+    [["  Hello ", "world  "], ["second\tline"]],
+    [[unicodedata.normalize("NFD", "Vi\u1EC7t Nam")]],
+    [["\u02C6x^2 + y\u0302"]],
+    [["Table of contents", "........", "12"]],
+    [["a", "----"], ["----", "b"]],
+    [["--", "--"], ["--", "--"]],
+    [["\x00\x07", "\u200B"], ["\uFEFF"]],
+    [["x\u00A0\u00A0y", "\u3000z"]],
+])
+def test_sanitize_spans_matches_legacy(spans):
+    assert current_consolidate(spans) == legacy_consolidate(spans)
+
+
+def test_sanitize_spans_matches_legacy_on_fuzzed_boxes():
+    _assert_matches_legacy(fuzz_boxes(FUZZ_BOXES))
+
+
+def test_sanitize_spans_matches_legacy_on_pdf_text():
+    with pymupdf.open() as doc:
+        page = doc.new_page()
+        page.insert_text((72, 72), "Results.......... 42   and    more", fontsize=11)
+        page.insert_text((72, 100), "E = mc^2 ** ---- ____", fontsize=11)
+        page.insert_textbox(pymupdf.Rect(72, 120, 300, 300), "A paragraph\nthat wraps\tacross lines.", fontsize=9)
+        boxes = [
+            [[span["text"] for span in line["spans"]] for line in block.get("lines", [])]
+            for block in page.get_text("dict")["blocks"]
+        ]
+    assert boxes
+    _assert_matches_legacy(boxes)
+
+
+def test_sanitize_text_is_a_single_span():
+    assert sanitize_text("  a  \x07 b\u0301 ") == legacy_consolidate([["  a  \x07 b\u0301 "]]) == "a b"
@@ -0,0 +1,77 @@
+# tests/test_translator.py
+"""
+Rate limit handling of batch_translate: a 429 whose Retry-After exceeds RATE_LIMIT_MAX_WAIT falls back
+to Google right away and leaves the shared limiter unpaused.
+"""
+import os
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+from utils import translator
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.acquired = []
+        self.paused = []
+
+    def acquire(self, tokens: int):
+        self.acquired.append(tokens)
+
+    def pause(self, seconds: float):
+        self.paused.append(seconds)
+
+
+def rate_limit_error(retry_after: str) -> RateLimitError:
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(translator, "rate_limiter", limiter)
+    monkeypatch.setattr(translator, "RATE_LIMIT_MAX_WAIT", 60.0)
+    monkeypatch.setattr(translator.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(translator, "google_translate_many",
+                        lambda texts, source, target: [f"google:{text}" for text in texts])
+    return limiter
+
+
+def test_long_retry_after_falls_back_without_pausing(monkeypatch, limiter):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        raise rate_limit_error("3600")
+
+    monkeypatch.setattr(translator.groq_client.chat.completions, "create", create)
+    results, from_llm = translator.batch_translate(["Hello", "World"], "en", "vi")
+
+    assert results == ["google:Hello", "google:World"]
+    assert from_llm == [False, False]
+    assert len(calls) == 1
+    assert limiter.paused == []
+
+
+def test_short_retry_after_pauses_and_retries(monkeypatch, limiter):
+    replies = iter([rate_limit_error("2"), None])
+
+    def create(**kwargs):
+        error = next(replies)
+        if error is not None:
+            raise error
+        message = type("Message", (), {"content": '{"translations": {"0": "Xin chào"}}'})
+        return type("Response", (), {"choices": [type("Choice", (), {"message": message})]})
+
+    monkeypatch.setattr(translator.groq_client.chat.completions, "create", create)
+    results, from_llm = translator.batch_translate(["Hello"], "en", "vi")
+
+    assert results == ["Xin chào"]
+    assert from_llm == [True]
+    assert limiter.paused == [2.0]
@@ -12,6 +12,26 @@ API_BASE_URL = "http://127.0.0.1:30000/api/pdf"
 TRANSLATE_ENDPOINT = f"{API_BASE_URL}/translate"
 TASK_STATUS_ENDPOINT = f"{API_BASE_URL}/task"
 
+STAGE_LABELS = {
+    "layout": "Phân tích bố cục",
+    "figures": "Cắt hình ảnh",
+    "translation": "Dịch văn bản",
+    "render": "Chèn văn bản",
+}
+
+
+def format_progress(progress, elapsed):
+    # Stage, pages and batches done and ETA reported by the worker
+    progress = progress or {}
+    parts = [STAGE_LABELS.get(progress.get("stage"), "Đang dịch PDF")]
+    if progress.get("pages_total"):
+        parts.append(f"trang {progress.get('pages_done', 0)}/{progress['pages_total']}")
+    if progress.get("batches_total"):
+        parts.append(f"batch {progress.get('batches_done', 0)}/{progress['batches_total']}")
+    if progress.get("eta_seconds") is not None:
+        parts.append(f"còn khoảng {int(progress['eta_seconds'])}s")
+    return f"{' – '.join(parts)} ({elapsed}s)"
+
 
 def submit_and_poll(pdf_file, source_lang, target_lang, font_style):
     if pdf_file is None:
@@ -47,7 +67,7 @@ def submit_and_poll(pdf_file, source_lang, target_lang, font_style):
             while True:
                 time.sleep(1.5)
                 try:
-                    r = requests.get(f"{TASK_STATUS_ENDPOINT}/{task_id}", timeout=30)
+                    r = requests.get(f"{TASK_STATUS_ENDPOINT}/{task_id}", timeout=30, stream=True)
 
                     if "application/json" in r.headers.get("Content-Type", ""):
                         data = r.json()
@@ -58,6 +78,8 @@ def submit_and_poll(pdf_file, source_lang, target_lang, font_style):
                             msg = f"Đang xếp hàng... chờ worker ({elapsed}s)"
                         elif status == "start":
                             msg = f"Đang dịch PDF... đã xử lý {elapsed}s"
+                        elif status == "progress":
+                            msg = format_progress(data.get("progress"), elapsed)
                         else:
                             msg = f"Trạng thái: {status}"
 
@@ -65,8 +87,10 @@ def submit_and_poll(pdf_file, source_lang, target_lang, font_style):
 
                     else:
                         temp_path = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf").name
+                        # Streams the translated PDF to disk instead of holding it in memory
                         with open(temp_path, "wb") as f:
-                            f.write(r.content)
+                            for chunk in r.iter_content(chunk_size=1024 * 1024):
+                                f.write(chunk)
 
                         total_time = time.time() - start_time
                         final_msg = add(f"Hoàn tất! Đã dịch xong trong {total_time:.1f}s")